@@ -5,18 +5,45 @@ StockAI ML Microservice
 - Stores embeddings in ChromaDB
 - Predicts stock movement with XGBoost
 - Returns risk-adjusted recommendations
+- Picks up the nightly feature panel + universal model (train_universal.py)
 """
 
+from contextlib import asynccontextmanager
+
+from apscheduler.schedulers.background import BackgroundScheduler
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 from app.routes import router
+from app.services.predictor import reload_models
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Training runs out of process (train_universal.py --schedule); every worker
+    # just polls for the artifacts it writes and swaps them in
+    scheduler = BackgroundScheduler(timezone="America/New_York")
+    scheduler.add_job(
+        reload_models,
+        "interval",
+        minutes=5,
+        id="reload_models",
+        coalesce=True,
+        max_instances=1,
+    )
+    scheduler.start()
+    yield
+    scheduler.shutdown(wait=False)
+
+
 app = FastAPI(
     title="StockAI ML Service",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -30,5 +57,5 @@ app.include_router(router, prefix="/api")
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok", "service": "ml-service"}
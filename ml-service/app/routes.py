@@ -1,11 +1,13 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List
+import asyncio
 import traceback
 
-from app.services.stock_data import get_stock_features, get_top_tickers
-from app.services.sentiment import analyze_sentiment
-from app.services.predictor import predict_movement
+from app.services.cache import cache_contains, cache_stats, features_cache
+from app.services.stock_data import YFContext, batch_download, get_stock_features, get_top_tickers, run_blocking
+from app.services.sentiment import analyze_sentiment, analyze_sentiment_batch
+from app.services.predictor import predict_movement_batch
 from app.services.recommender import generate_recommendations
 
 router = APIRouter()
@@ -43,37 +45,56 @@ async def predict(req: PredictRequest):
     try:
         # 1. Build ticker list: user holdings + popular tickers
         held_tickers = [h.ticker.upper() for h in req.currentHoldings]
-        market_tickers = get_top_tickers(req.riskProfile.preferredSectors)
-        all_tickers = list(set(held_tickers + market_tickers))[:15]  # cap at 15
-
-        recommendations = []
-
-        for ticker in all_tickers:
-            try:
-                # 2. Get stock features (price, volume, technicals)
-                features = get_stock_features(ticker)
-                if features is None:
-                    continue
-
-                # 3. Sentiment from Gemini
-                sentiment = await analyze_sentiment(ticker)
-
-                # 4. XGBoost prediction
-                prediction = predict_movement(ticker, features, sentiment["score"])
-
-                # 5. Build recommendation object
-                recommendations.append({
-                    "ticker": ticker,
-                    "sentimentScore": sentiment["score"],
-                    "xgboostPrediction": prediction["probability"],
-                    "aiExplanation": sentiment["explanation"],
-                    "features": features,
-                    "prediction": prediction,
-                })
-
-            except Exception as e:
-                print(f"[WARN] Skipping {ticker}: {e}")
-                continue
+        market_tickers = get_top_tickers(
+            frozenset(s.lower().strip() for s in req.riskProfile.preferredSectors)
+        )
+        all_tickers = list(set(held_tickers).union(market_tickers))[:15]  # cap at 15
+
+        # One batched price download for every ticker not already cached
+        to_fetch = [t for t in all_tickers if not cache_contains(features_cache, t)]
+        histories = await run_blocking(batch_download, to_fetch, "2y")
+        contexts = [YFContext(t, history_2y=histories.get(t)) for t in all_tickers]
+
+        # 2. Stock features (price, volume, technicals) for every ticker, concurrently
+        results = await asyncio.gather(
+            *(get_stock_features(c) for c in contexts),
+            return_exceptions=True,
+        )
+
+        with_features = []
+        for context, result in zip(contexts, results):
+            if isinstance(result, Exception):
+                print(f"[WARN] Skipping {context.ticker}: {result}")
+            elif result is not None:
+                with_features.append((context, result))
+
+        # 3. Sentiment from Gemini — one prompt covering every ticker
+        sentiments = await analyze_sentiment_batch([c for c, _ in with_features])
+        scored = [(c, f, sentiments[c.ticker]) for c, f in with_features]
+
+        print(f"[cache] {cache_stats()}")
+
+        # 4. XGBoost prediction — one batched call for all tickers
+        predictions = await run_blocking(
+            predict_movement_batch,
+            [c.ticker for c, _, _ in scored],
+            [f for _, f, _ in scored],
+            [s["score"] for _, _, s in scored],
+            [c.history_2y for c, _, _ in scored],
+        )
+
+        # 5. Build recommendation objects
+        recommendations = [
+            {
+                "ticker": context.ticker,
+                "sentimentScore": sentiment["score"],
+                "xgboostPrediction": prediction["probability"],
+                "aiExplanation": sentiment["explanation"],
+                "features": features,
+                "prediction": prediction,
+            }
+            for (context, features, sentiment), prediction in zip(scored, predictions)
+        ]
 
         # 6. Rerank by risk profile
         final = generate_recommendations(
@@ -92,22 +113,22 @@ async def predict(req: PredictRequest):
 
 
 @router.get("/tickers")
-def get_available_tickers():
+async def get_available_tickers():
     """Returns the default list of tickers the service monitors."""
-    return {"tickers": get_top_tickers([])}
+    return {"tickers": list(get_top_tickers(frozenset()))}
 
 
 @router.get("/sentiment/{ticker}")
 async def get_sentiment(ticker: str):
     """Get sentiment analysis for a single ticker."""
-    result = await analyze_sentiment(ticker.upper())
+    result = await analyze_sentiment(YFContext(ticker.upper()))
     return result
 
 
 @router.get("/features/{ticker}")
-def get_features(ticker: str):
+async def get_features(ticker: str):
     """Get raw stock features for a ticker."""
-    features = get_stock_features(ticker.upper())
+    features = await get_stock_features(YFContext(ticker.upper()))
     if features is None:
         raise HTTPException(status_code=404, detail=f"No data for {ticker}")
-    return features
+    return features.to_dict()
@@ -0,0 +1,56 @@
+"""
+Cache service — short-lived, in-process caches for per-ticker results.
+
+Features and sentiment change slowly compared to how often /predict is hit,
+so repeated lookups for the same ticker are served from memory.
+"""
+
+import asyncio
+import threading
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cachetools import TTLCache
+
+features_cache = TTLCache(maxsize=512, ttl=900)      # 15 min
+sentiment_cache = TTLCache(maxsize=512, ttl=1800)    # 30 min
+
+# TTLCache isn't thread-safe and features are computed in worker threads
+_lock = threading.Lock()
+_stats = Counter()
+
+# In-flight async fetches, so concurrent requests for one key share a single call
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def cache_get(cache: TTLCache, key: str, name: str) -> Optional[Any]:
+    """Look up a key and record a hit or miss under `name`."""
+    with _lock:
+        value = cache.get(key)
+        _stats[f"{name}_{'hits' if value is not None else 'misses'}"] += 1
+    return value
+
+
+def cache_set(cache: TTLCache, key: str, value: Any) -> None:
+    with _lock:
+        cache[key] = value
+
+
+def cache_contains(cache: TTLCache, key: str) -> bool:
+    with _lock:
+        return key in cache
+
+
+async def singleflight(key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Run fetch() once per key; concurrent callers await the same result."""
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(fetch())
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(future)
+
+
+def cache_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats)
@@ -2,33 +2,188 @@
 Predictor service — uses XGBoost to predict stock movement probability.
 
 Strategy:
-- Trains on-the-fly using 6 months of historical data per ticker
-- Features: technical indicators + sentiment score
+- Indicator panel for all sector tickers materialized nightly (after US close)
+  to app/models/features.pkl, so training never recomputes it on a request
+- One universal model trained on that panel by the standalone
+  train_universal.py job (never inside the API workers); also exported to
+  ONNX and served through onnxruntime when it's installed
+- Each worker loads the artifacts at import and swaps in newer ones via
+  reload_models(), publishing booster + session + panel as one snapshot
+- Falls back to training on-the-fly per ticker when no universal model exists
+- Features: technical indicators + sector one-hot, blended with sentiment score
 - Target: whether stock goes UP in next 5 trading days
-- Caches trained models per ticker to avoid retraining every call
 """
 
 import os
-import pickle
+import joblib
+from dataclasses import dataclass, field
+from operator import attrgetter
 import numpy as np
 import pandas as pd
 import yfinance as yf
 import xgboost as xgb
-from sklearn.model_selection import TimeSeriesSplit
 from sklearn.metrics import accuracy_score
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+
+from app.services.stock_data import SECTOR_TICKERS, StockFeatures, batch_download
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional — fall back to the XGBoost booster
+    ort = None
 
-# Cache trained models in memory
-_model_cache: Dict[str, xgb.XGBClassifier] = {}
 _MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
 os.makedirs(_MODEL_DIR, exist_ok=True)
+_UNIVERSAL_PATH = os.path.join(_MODEL_DIR, "universal.joblib")
+_PANEL_PATH = os.path.join(_MODEL_DIR, "features.pkl")
+_ONNX_PATH = os.path.join(_MODEL_DIR, "universal.onnx")
+
+FEATURE_COLS = [
+    "sma5", "sma20", "sma50", "rsi", "macd", "macd_signal",
+    "bb_position", "volatility", "vol_ratio",
+    "pct_1d", "pct_5d", "pct_20d",
+    "price_vs_sma20", "price_vs_sma50",
+]
+
+# StockFeatures attribute for each training column, in the same order
+_feature_values = attrgetter(
+    "sma5", "sma20", "sma50", "rsi", "macd", "macd_signal",
+    "bb_position", "volatility", "volume_ratio",
+    "pct_change_1d", "pct_change_5d", "pct_change_20d",
+    "price_vs_sma20", "price_vs_sma50",
+)
+
+SECTORS = list(SECTOR_TICKERS)
+SECTOR_COLS = [f"sector_{s}" for s in SECTORS]
+_TICKER_SECTOR = {t: s for s, tickers in SECTOR_TICKERS.items() for t in tickers}
+
+
+def _load_universal_model() -> Optional[xgb.Booster]:
+    if not os.path.exists(_UNIVERSAL_PATH):
+        return None
+    try:
+        model = joblib.load(_UNIVERSAL_PATH)
+        print(f"[predictor] Loaded universal model from {_UNIVERSAL_PATH}")
+        return model.get_booster()
+    except Exception as e:
+        print(f"[predictor] Could not load universal model: {e}")
+        return None
 
 
-def _build_training_data(ticker: str) -> Optional[pd.DataFrame]:
-    """Build feature matrix from historical data."""
+def _load_onnx_session(booster: Optional[xgb.Booster]) -> Optional["ort.InferenceSession"]:
+    if ort is None or booster is None or not os.path.exists(_ONNX_PATH):
+        return None
     try:
-        stock = yf.Ticker(ticker)
-        df = stock.history(period="2y", interval="1d")
+        session = ort.InferenceSession(_ONNX_PATH, providers=["CPUExecutionProvider"])
+        print(f"[predictor] Loaded ONNX universal model from {_ONNX_PATH}")
+        return session
+    except Exception as e:
+        print(f"[predictor] Could not load ONNX model: {e}")
+        return None
+
+
+def _load_feature_panel() -> Dict[str, pd.DataFrame]:
+    if not os.path.exists(_PANEL_PATH):
+        return {}
+    try:
+        panel = pd.read_pickle(_PANEL_PATH)
+        print(f"[predictor] Loaded feature panel from {_PANEL_PATH} ({len(panel)} rows)")
+        return {t: df.drop(columns="ticker") for t, df in panel.groupby("ticker", sort=False)}
+    except Exception as e:
+        print(f"[predictor] Could not load feature panel: {e}")
+        return {}
+
+
+@dataclass(frozen=True)
+class _ModelState:
+    """
+    Everything inference reads, published as one object so a request never
+    pairs a new booster with an old ONNX session or feature panel.
+    """
+    booster: Optional[xgb.Booster] = None  # universal model
+    session: Optional["ort.InferenceSession"] = None  # ONNX export of `booster`
+    panel: Dict[str, pd.DataFrame] = field(default_factory=dict)  # nightly training matrices
+    fallback: Dict[str, xgb.Booster] = field(default_factory=dict)  # per-ticker models trained on `panel`
+    mtime: float = 0.0  # universal.joblib mtime this snapshot was loaded from
+
+
+def _model_mtime() -> float:
+    try:
+        return os.path.getmtime(_UNIVERSAL_PATH)
+    except OSError:
+        return 0.0
+
+
+def _load_state() -> _ModelState:
+    mtime = _model_mtime()
+    booster = _load_universal_model()
+    return _ModelState(booster, _load_onnx_session(booster), _load_feature_panel(), mtime=mtime)
+
+
+# Read once per request (`state = _STATE`) and only ever replaced wholesale
+_STATE: _ModelState = _load_state()
+
+
+def reload_models() -> bool:
+    """Swap in artifacts written by train_universal.py since the last load."""
+    global _STATE
+
+    if _model_mtime() == _STATE.mtime:
+        return False
+    _STATE = _load_state()
+    return True
+
+
+def _atomic_save(save, path: str) -> None:
+    """Write via a temp file so a reloading worker never reads a half-written artifact."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    save(tmp)
+    os.replace(tmp, path)
+
+
+def _export_onnx(model: xgb.XGBClassifier, n_features: int) -> None:
+    """Convert the universal model to ONNX for onnxruntime inference."""
+    try:
+        import onnxmltools
+        from onnxmltools.convert.common.data_types import FloatTensorType
+
+        onnx_model = onnxmltools.convert_xgboost(
+            model, initial_types=[("float_input", FloatTensorType([None, n_features]))]
+        )
+        _atomic_save(lambda path: onnxmltools.utils.save_model(onnx_model, path), _ONNX_PATH)
+    except Exception as e:
+        # Never serve a stale export next to a freshly trained booster
+        print(f"[predictor] ONNX export skipped: {e}")
+        if os.path.exists(_ONNX_PATH):
+            os.remove(_ONNX_PATH)
+
+
+def _universal_proba(state: _ModelState, X: np.ndarray) -> np.ndarray:
+    """Up-probabilities from the universal model for a float32 feature matrix."""
+    if state.session is not None:
+        return state.session.run(None, {"float_input": X})[1][:, 1]
+    return state.booster.inplace_predict(X)
+
+
+def _build_training_data(ticker: str, panel: Dict[str, pd.DataFrame],
+                         history: Optional[pd.DataFrame] = None) -> Optional[pd.DataFrame]:
+    """Training matrix for a ticker — from the nightly panel when it's there."""
+    df = panel.get(ticker)
+    if df is not None:
+        return df
+    if history is None:
+        try:
+            history = yf.Ticker(ticker).history(period="2y", interval="1d")
+        except Exception as e:
+            print(f"[predictor] History fetch error for {ticker}: {e}")
+            return None
+    return _compute_training_data(ticker, history)
+
+
+def _compute_training_data(ticker: str, history: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Build feature matrix from 2y of daily history."""
+    try:
+        df = history.copy()
 
         if df.empty or len(df) < 100:
             return None
@@ -79,29 +234,22 @@ def _build_training_data(ticker: str) -> Optional[pd.DataFrame]:
         df["target"] = (df["future_return"] > 0).astype(int)
 
         # Drop NaN rows
-        feature_cols = [
-            "sma5", "sma20", "sma50", "rsi", "macd", "macd_signal",
-            "bb_position", "volatility", "vol_ratio",
-            "pct_1d", "pct_5d", "pct_20d",
-            "price_vs_sma20", "price_vs_sma50",
-        ]
-
-        df = df.dropna(subset=feature_cols + ["target"])
-        return df[feature_cols + ["target"]]
+        df = df.dropna(subset=FEATURE_COLS + ["target"])
+        return df[FEATURE_COLS + ["target"]]
 
     except Exception as e:
         print(f"[predictor] Training data error for {ticker}: {e}")
         return None
 
 
-def _train_model(ticker: str) -> Optional[xgb.XGBClassifier]:
+def _train_model(ticker: str, state: _ModelState,
+                 history: Optional[pd.DataFrame] = None) -> Optional[xgb.Booster]:
     """Train an XGBoost classifier for a specific ticker."""
-    df = _build_training_data(ticker)
+    df = _build_training_data(ticker, state.panel, history)
     if df is None or len(df) < 60:
         return None
 
-    feature_cols = [c for c in df.columns if c != "target"]
-    X = df[feature_cols].values
+    X = df[FEATURE_COLS].values
     y = df["target"].values
 
     model = xgb.XGBClassifier(
@@ -110,7 +258,9 @@ def _train_model(ticker: str) -> Optional[xgb.XGBClassifier]:
         learning_rate=0.1,
         subsample=0.8,
         colsample_bytree=0.8,
-        use_label_encoder=False,
+        tree_method="hist",
+        max_bin=256,
+        n_jobs=1,  # trained on the request path — don't compete with the server for cores
         eval_metric="logloss",
         random_state=42,
     )
@@ -125,48 +275,121 @@ def _train_model(ticker: str) -> Optional[xgb.XGBClassifier]:
     val_acc = accuracy_score(y_val, model.predict(X_val))
     print(f"[predictor] {ticker} model trained — val accuracy: {val_acc:.2%}")
 
-    # Cache
-    _model_cache[ticker] = model
+    # Cache alongside the panel it was trained on
+    booster = model.get_booster()
+    state.fallback[ticker] = booster
+
+    return booster
 
+
+def _sector_onehot(ticker: str) -> List[float]:
+    sector = _TICKER_SECTOR.get(ticker)
+    return [1.0 if s == sector else 0.0 for s in SECTORS]
+
+
+def build_feature_panel(tickers: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Compute the indicator/target matrix for every ticker from one batched
+    2y download and save it as the panel that training reads from.
+    """
+    tickers = tickers or [t for group in SECTOR_TICKERS.values() for t in group]
+    histories = batch_download(tickers, "2y")
+
+    panel = {}
+    for ticker in tickers:
+        history = histories.get(ticker)
+        df = _compute_training_data(ticker, history) if history is not None else None
+        if df is None:
+            continue
+        panel[ticker] = df
+        print(f"[predictor] {ticker}: {len(df)} rows")
+
+    if panel:
+        frame = pd.concat([df.assign(ticker=t) for t, df in panel.items()])
+        _atomic_save(frame.to_pickle, _PANEL_PATH)
+    return panel
+
+
+def train_universal_model(tickers: Optional[List[str]] = None) -> Optional[xgb.XGBClassifier]:
+    """
+    Rebuild the feature panel, then train one classifier on all tickers
+    with the ticker's sector one-hot encoded, and save it for the service.
+    Runs in train_universal.py; API workers pick the files up via reload_models().
+    """
+    panel = build_feature_panel(tickers)
+    frames = [
+        df.assign(**dict(zip(SECTOR_COLS, _sector_onehot(ticker))))
+        for ticker, df in panel.items()
+    ]
+
+    if not frames:
+        print("[predictor] No training data — universal model not trained")
+        return None
+
+    # Time-ordered split per ticker: last 20% of each series is validation
+    train_parts, val_parts = [], []
+    for df in frames:
+        split = int(len(df) * 0.8)
+        train_parts.append(df.iloc[:split])
+        val_parts.append(df.iloc[split:])
+    train, val = pd.concat(train_parts), pd.concat(val_parts)
+
+    cols = FEATURE_COLS + SECTOR_COLS
+    model = xgb.XGBClassifier(
+        n_estimators=200,
+        max_depth=4,
+        learning_rate=0.05,
+        subsample=0.8,
+        colsample_bytree=0.8,
+        tree_method="hist",
+        device="cpu",
+        n_jobs=-1,
+        eval_metric="logloss",
+        random_state=42,
+    )
+    model.fit(train[cols].values, train["target"].values,
+              eval_set=[(val[cols].values, val["target"].values)], verbose=False)
+
+    val_acc = accuracy_score(val["target"].values, model.predict(val[cols].values))
+    print(f"[predictor] Universal model trained on {len(frames)} tickers — val accuracy: {val_acc:.2%}")
+
+    # ONNX first: universal.joblib's mtime is what workers watch, so it lands last
+    _export_onnx(model, len(cols))
+    _atomic_save(lambda path: joblib.dump(model, path), _UNIVERSAL_PATH)
     return model
 
 
-def predict_movement(ticker: str, features: Dict, sentiment_score: float) -> Dict:
+def _feature_vector(features: StockFeatures) -> List[float]:
+    return list(_feature_values(features))
+
+
+def predict_movement(ticker: str, features: StockFeatures, sentiment_score: float,
+                     history: Optional[pd.DataFrame] = None) -> Dict:
     """
     Predict whether a stock moves UP in the next 5 days.
     Combines technical features with sentiment.
     """
-    # Get or train model
-    model = _model_cache.get(ticker)
-    if model is None:
-        model = _train_model(ticker)
+    state = _STATE  # one consistent snapshot for the whole request
+    universal = state.booster is not None
+
+    # Universal model first, per-ticker model as fallback
+    booster = state.booster if universal else state.fallback.get(ticker)
+    if booster is None:
+        booster = _train_model(ticker, state, history)
 
-    if model is None:
+    if booster is None:
         # Fallback: use a simple heuristic
         return _heuristic_prediction(features, sentiment_score)
 
     # Build feature vector (same order as training)
     try:
-        feature_vector = np.array([[
-            features.get("sma5", 0),
-            features.get("sma20", 0),
-            features.get("sma50", 0),
-            features.get("rsi", 50),
-            features.get("macd", 0),
-            features.get("macdSignal", 0),
-            features.get("bbPosition", 0.5),
-            features.get("volatility", 0.2),
-            features.get("volumeRatio", 1.0),
-            features.get("pctChange1d", 0),
-            features.get("pctChange5d", 0),
-            features.get("pctChange20d", 0),
-            features.get("priceVsSma20", 0),
-            features.get("priceVsSma50", 0),
-        ]])
-
-        # Predict probability
-        proba = model.predict_proba(feature_vector)[0]
-        up_prob = float(proba[1]) if len(proba) > 1 else 0.5
+        row = _feature_vector(features)
+        if universal:
+            row += _sector_onehot(ticker)
+
+        # Predict probability — inplace_predict skips DMatrix construction
+        X = np.asarray([row], dtype=np.float32)
+        up_prob = float((_universal_proba(state, X) if universal else booster.inplace_predict(X))[0])
 
         # Blend with sentiment (30% sentiment weight)
         sentiment_factor = (sentiment_score + 1) / 2  # normalize 0-1
@@ -185,24 +408,69 @@ def predict_movement(ticker: str, features: Dict, sentiment_score: float) -> Dic
         return _heuristic_prediction(features, sentiment_score)
 
 
-def _heuristic_prediction(features: Dict, sentiment_score: float) -> Dict:
+def predict_movement_batch(tickers: List[str], features_list: List[StockFeatures], sentiments: List[float],
+                           histories: Optional[List[Optional[pd.DataFrame]]] = None) -> List[Dict]:
+    """
+    Score many tickers with a single call to the universal model.
+    Without one, falls back to per-ticker predict_movement (trained on the
+    already-fetched 2y histories when given).
+    """
+    if not tickers:
+        return []
+
+    state = _STATE
+    if state.booster is None:
+        histories = histories or [None] * len(tickers)
+        return [
+            predict_movement(t, f, s, h)
+            for t, f, s, h in zip(tickers, features_list, sentiments, histories)
+        ]
+
+    try:
+        X = np.asarray(
+            [_feature_vector(f) + _sector_onehot(t) for t, f in zip(tickers, features_list)],
+            dtype=np.float32,
+        )
+        up_prob = _universal_proba(state, X)
+
+        # Blend with sentiment (30% sentiment weight)
+        sentiment_factor = (np.asarray(sentiments, dtype=np.float64) + 1) / 2
+        blended = 0.7 * up_prob + 0.3 * sentiment_factor
+
+    except Exception as e:
+        print(f"[predictor] Batch prediction error: {e}")
+        return [_heuristic_prediction(f, s) for f, s in zip(features_list, sentiments)]
+
+    return [
+        {
+            "probability": round(float(b), 4),
+            "rawXgboost": round(float(p), 4),
+            "sentimentFactor": round(float(sf), 4),
+            "direction": "up" if b > 0.5 else "down",
+            "method": "xgboost",
+        }
+        for b, p, sf in zip(blended, up_prob, sentiment_factor)
+    ]
+
+
+def _heuristic_prediction(features: StockFeatures, sentiment_score: float) -> Dict:
     """Simple rules-based fallback when XGBoost can't be trained."""
     score = 0.5
 
-    rsi = features.get("rsi", 50)
+    rsi = features.rsi
     if rsi < 30:
         score += 0.15  # oversold = potential upside
     elif rsi > 70:
         score -= 0.15  # overbought = potential downside
 
-    if features.get("macd", 0) > features.get("macdSignal", 0):
+    if features.macd > features.macd_signal:
         score += 0.1
     else:
         score -= 0.1
 
-    if features.get("pctChange5d", 0) > 0.02:
+    if features.pct_change_5d > 0.02:
         score += 0.05
-    elif features.get("pctChange5d", 0) < -0.02:
+    elif features.pct_change_5d < -0.02:
         score -= 0.05
 
     # Blend sentiment
@@ -5,59 +5,54 @@ Outputs final Buy/Sell/Hold recommendations.
 
 from typing import Dict, List
 
+import numpy as np
+import pandas as pd
 
-def _compute_confidence(pred: Dict, features: Dict) -> float:
+
+# Risk-adjusted thresholds
+_THRESHOLDS = {
+    "conservative": {"strong_buy": 0.75, "buy": 0.62, "sell": 0.38, "strong_sell": 0.25},
+    "moderate": {"strong_buy": 0.70, "buy": 0.58, "sell": 0.42, "strong_sell": 0.30},
+    "aggressive": {"strong_buy": 0.65, "buy": 0.55, "sell": 0.45, "strong_sell": 0.35},
+}
+_ACTIONS = ["strong_buy", "buy", "strong_sell", "sell"]
+_ACTION_PRIORITY = {"strong_buy": 0, "strong_sell": 1, "buy": 2, "sell": 3, "hold": 4}
+_MAX_RECS = {"conservative": 5, "moderate": 8, "aggressive": 12}
+
+
+def _compute_confidence(df: pd.DataFrame) -> pd.Series:
     """
-    Compute a confidence score (0-1) based on:
+    Compute a confidence score (0-1) per row based on:
     - How strong the prediction is (away from 0.5)
     - How many signals agree
     - Volume confirmation
     """
-    prob = pred.get("probability", 0.5)
-    strength = abs(prob - 0.5) * 2  # 0 to 1
+    up, down = df["prob"] > 0.5, df["prob"] < 0.5
+    strength = (df["prob"] - 0.5).abs() * 2  # 0 to 1
 
     # Signal agreement bonus
-    signals = 0
-    rsi = features.get("rsi", 50)
-    if (prob > 0.5 and rsi < 40) or (prob < 0.5 and rsi > 60):
-        signals += 1
-
-    macd = features.get("macd", 0)
-    macd_sig = features.get("macdSignal", 0)
-    if (prob > 0.5 and macd > macd_sig) or (prob < 0.5 and macd < macd_sig):
-        signals += 1
-
-    vol_ratio = features.get("volumeRatio", 1.0)
-    if vol_ratio > 1.2:
-        signals += 1  # volume confirms movement
-
-    agreement_bonus = signals * 0.1
-
-    confidence = min(1.0, strength + agreement_bonus)
-    return round(confidence, 4)
-
-
-def _map_to_action(probability: float, confidence: float, risk: str) -> str:
-    """Map prediction probability to recommendation action."""
-    # Risk-adjusted thresholds
-    thresholds = {
-        "conservative": {"strong_buy": 0.75, "buy": 0.62, "sell": 0.38, "strong_sell": 0.25},
-        "moderate": {"strong_buy": 0.70, "buy": 0.58, "sell": 0.42, "strong_sell": 0.30},
-        "aggressive": {"strong_buy": 0.65, "buy": 0.55, "sell": 0.45, "strong_sell": 0.35},
-    }
-
-    t = thresholds.get(risk, thresholds["moderate"])
-
-    if probability >= t["strong_buy"] and confidence >= 0.5:
-        return "strong_buy"
-    elif probability >= t["buy"]:
-        return "buy"
-    elif probability <= t["strong_sell"] and confidence >= 0.5:
-        return "strong_sell"
-    elif probability <= t["sell"]:
-        return "sell"
-    else:
-        return "hold"
+    signals = (
+        ((up & (df["rsi"] < 40)) | (down & (df["rsi"] > 60))).astype(int)
+        + ((up & (df["macd"] > df["macdSignal"])) | (down & (df["macd"] < df["macdSignal"]))).astype(int)
+        + (df["volumeRatio"] > 1.2).astype(int)  # volume confirms movement
+    )
+
+    return (strength + signals * 0.1).clip(upper=1.0).round(4)
+
+
+def _map_to_action(probability: pd.Series, confidence: pd.Series, risk: str) -> np.ndarray:
+    """Map prediction probabilities to recommendation actions."""
+    t = _THRESHOLDS.get(risk, _THRESHOLDS["moderate"])
+    return np.select(
+        [
+            (probability >= t["strong_buy"]) & (confidence >= 0.5),
+            probability >= t["buy"],
+            (probability <= t["strong_sell"]) & (confidence >= 0.5),
+            probability <= t["sell"],
+        ],
+        _ACTIONS,
+        default="hold",
+    )
 
 
 def generate_recommendations(
@@ -73,54 +68,55 @@ def generate_recommendations(
     Conservative: fewer recommendations, higher thresholds, prefer low volatility
     Aggressive: more recommendations, lower thresholds, ok with high volatility
     """
-    recommendations = []
-
-    for item in raw_predictions:
-        features = item.get("features", {})
-        prediction = item.get("prediction", {})
-        ticker = item["ticker"]
-
-        probability = prediction.get("probability", 0.5)
-        confidence = _compute_confidence(prediction, features)
-
-        # Volatility filter for conservative investors
-        volatility = features.get("volatility", 0.2)
-        if risk_tolerance == "conservative" and volatility > 0.5:
-            continue  # skip high-volatility stocks
-
-        # Map to action
-        action = _map_to_action(probability, confidence, risk_tolerance)
-
-        # Horizon adjustments
-        if horizon == "short" and action == "hold":
-            continue  # short-term traders don't want hold signals
-        if horizon == "long" and action in ["sell", "strong_sell"] and ticker not in held_tickers:
-            continue  # don't suggest selling stocks you don't own for long-term
-
-        # Build final recommendation
-        rec = {
-            "ticker": ticker,
-            "recommendation": action,
-            "confidenceScore": confidence,
+    if not raw_predictions:
+        return []
+
+    df = pd.DataFrame([
+        {
+            "ticker": item["ticker"],
+            "prob": item["prediction"].get("probability", 0.5),
+            "rsi": item["features"].rsi,
+            "macd": item["features"].macd,
+            "macdSignal": item["features"].macd_signal,
+            "volumeRatio": item["features"].volume_ratio,
+            "volatility": item["features"].volatility,
             "sentimentScore": item.get("sentimentScore", 0),
-            "xgboostPrediction": prediction.get("rawXgboost"),
+            "xgboostPrediction": item["prediction"].get("rawXgboost"),
             "aiExplanation": item.get("aiExplanation", ""),
-            "currentPrice": features.get("currentPrice"),
-            "companyName": features.get("companyName", ticker),
-            "sector": features.get("sector", "Unknown"),
+            "currentPrice": item["features"].current_price,
+            "companyName": item["features"].company_name,
+            "sector": item["features"].sector,
         }
-
-        recommendations.append(rec)
+        for item in raw_predictions
+    ])
+
+    df["confidenceScore"] = _compute_confidence(df)
+    df["recommendation"] = _map_to_action(df["prob"], df["confidenceScore"], risk_tolerance)
+
+    keep = pd.Series(True, index=df.index)
+    # Volatility filter for conservative investors
+    if risk_tolerance == "conservative":
+        keep &= df["volatility"] <= 0.5  # skip high-volatility stocks
+    # Horizon adjustments
+    if horizon == "short":
+        keep &= df["recommendation"] != "hold"  # short-term traders don't want hold signals
+    if horizon == "long":
+        # don't suggest selling stocks you don't own for long-term
+        keep &= ~(df["recommendation"].isin(["sell", "strong_sell"]) & ~df["ticker"].isin(held_tickers))
+    df = df[keep]
 
     # Sort: strong signals first, then by confidence
-    action_priority = {"strong_buy": 0, "strong_sell": 1, "buy": 2, "sell": 3, "hold": 4}
-    recommendations.sort(key=lambda r: (
-        action_priority.get(r["recommendation"], 5),
-        -r["confidenceScore"],
-    ))
+    df = df.assign(priority=df["recommendation"].map(_ACTION_PRIORITY))
+    df = df.sort_values(["priority", "confidenceScore"], ascending=[True, False], kind="stable")
 
     # Limit results
-    max_recs = {"conservative": 5, "moderate": 8, "aggressive": 12}
-    limit = max_recs.get(risk_tolerance, 8)
+    limit = _MAX_RECS.get(risk_tolerance, 8)
+    df = df.head(limit)
+
+    # Heuristic predictions have no raw XGBoost score — keep them null, not NaN
+    df["xgboostPrediction"] = df["xgboostPrediction"].astype(object).where(df["xgboostPrediction"].notna(), None)
 
-    return recommendations[:limit]
+    return df[[
+        "ticker", "recommendation", "confidenceScore", "sentimentScore", "xgboostPrediction",
+        "aiExplanation", "currentPrice", "companyName", "sector",
+    ]].to_dict("records")
@@ -3,30 +3,83 @@ Sentiment analysis service — uses Gemini to score financial news and ChromaDB
 """
 
 import os
-import json
+import asyncio
+import orjson
 import google.generativeai as genai
 import chromadb
-import yfinance as yf
-from typing import Dict
+import xxhash
+from typing import Dict, List
+
+from app.services.cache import sentiment_cache, cache_get, cache_set, singleflight
+from app.services.stock_data import YFContext, run_blocking
 
 # Initialize Gemini
 genai.configure(api_key=os.getenv("GEMINI_API_KEY", ""))
 
-model = genai.GenerativeModel("gemini-2.0-flash")
+# Constrained decoding — Gemini returns bare JSON matching these schemas
+_SENTIMENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "number"},
+        "explanation": {"type": "string"},
+    },
+    "required": ["score", "explanation"],
+}
+_BATCH_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema={
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {"ticker": {"type": "string"}, **_SENTIMENT_SCHEMA["properties"]},
+            "required": ["ticker", *_SENTIMENT_SCHEMA["required"]],
+        },
+    },
+)
+
+model = genai.GenerativeModel(
+    "gemini-2.0-flash",
+    generation_config=genai.GenerationConfig(
+        response_mime_type="application/json",
+        response_schema=_SENTIMENT_SCHEMA,
+    ),
+)
 
 # Initialize ChromaDB for storing news + embeddings
-chroma_client = chromadb.Client()  # in-memory; use PersistentClient for production
+chroma_client = chromadb.PersistentClient(path=os.getenv("CHROMA_DIR", "./chroma"))
 news_collection = chroma_client.get_or_create_collection(
     name="stock_news",
     metadata={"hnsw:space": "cosine"},
 )
 
 
-def _fetch_news(ticker: str) -> list[str]:
-    """Pull recent news headlines for a ticker via yfinance."""
+_PROMPT_TEMPLATE = """You are a financial sentiment analyst. Analyze these news headlines for {ticker} and respond ONLY with valid JSON — no markdown, no backticks, no explanation outside the JSON.
+
+Headlines:
+{headlines}
+
+Return this exact JSON format:
+{{"score": <float between -1.0 and 1.0>, "explanation": "<one sentence explaining the market sentiment for {ticker}>"}}
+
+Score guide: -1.0 = extremely bearish, 0.0 = neutral, 1.0 = extremely bullish.
+Be precise and base your analysis only on the headlines provided."""
+
+_BATCH_PROMPT_TEMPLATE = """You are a financial sentiment analyst. For each ticker below, analyze its news headlines and respond ONLY with valid JSON — no markdown, no backticks, no explanation outside the JSON.
+
+{sections}
+
+Return a JSON array with exactly one object per ticker, in this format:
+[{{"ticker": "<ticker symbol>", "score": <float between -1.0 and 1.0>, "explanation": "<one sentence explaining the market sentiment for that ticker>"}}]
+
+Score guide: -1.0 = extremely bearish, 0.0 = neutral, 1.0 = extremely bullish.
+Be precise and base each analysis only on that ticker's own headlines."""
+
+
+async def _fetch_news(context: YFContext) -> list[str]:
+    """Pull recent news headlines for a ticker via the shared yfinance context."""
+    ticker = context.ticker
     try:
-        stock = yf.Ticker(ticker)
-        news = stock.news or []
+        news = await context.news()
 
         headlines = []
         for item in news[:10]:
@@ -45,62 +98,122 @@ def _fetch_news(ticker: str) -> list[str]:
 def _store_in_chromadb(ticker: str, headlines: list[str], sentiment_score: float):
     """Store news headlines in ChromaDB for later RAG-style explanations."""
     try:
-        for i, headline in enumerate(headlines[:5]):
-            doc_id = f"{ticker}_{i}_{hash(headline) % 10000}"
-            news_collection.upsert(
-                documents=[headline],
-                metadatas=[{"ticker": ticker, "sentiment": sentiment_score}],
-                ids=[doc_id],
-            )
+        # One upsert for all headlines so the embedder can batch them.
+        # Ids are a content fingerprint, so a headline seen again overwrites
+        # its earlier entry instead of piling up; dedupe within the batch too.
+        docs = list(dict.fromkeys(headlines[:5]))
+        news_collection.upsert(
+            documents=docs,
+            metadatas=[{"ticker": ticker, "sentiment": sentiment_score}] * len(docs),
+            ids=[f"{ticker}:{xxhash.xxh64_intdigest(h.encode()):016x}" for h in docs],
+        )
     except Exception as e:
         print(f"[chromadb] Store error: {e}")
 
 
-async def analyze_sentiment(ticker: str) -> Dict:
+async def _finish(ticker: str, headlines: list[str], result: Dict) -> Dict:
+    """Clamp and cache a parsed Gemini result, storing its headlines in ChromaDB."""
+    score = max(-1.0, min(1.0, float(result.get("score", 0))))
+    explanation = result.get("explanation", f"Sentiment for {ticker} is neutral.")
+
+    # Store in ChromaDB off the event loop
+    await run_blocking(_store_in_chromadb, ticker, headlines, score)
+
+    result = {
+        "ticker": ticker,
+        "score": round(score, 4),
+        "explanation": explanation,
+        "headlineCount": len(headlines),
+    }
+    # Only real scores are cached — the neutral fallback should be retried
+    cache_set(sentiment_cache, ticker, result)
+    return result
+
+
+async def analyze_sentiment_batch(contexts: List[YFContext]) -> Dict[str, Dict]:
     """
-    1. Fetch news headlines for ticker
-    2. Send to Gemini for sentiment scoring
-    3. Store in ChromaDB
-    4. Return score + explanation
+    Sentiment for many tickers with a single Gemini call. Cached tickers are
+    skipped; tickers the model leaves out of its answer are retried one by one.
     """
-    headlines = _fetch_news(ticker)
-    headlines_text = "\n".join(f"- {h}" for h in headlines)
+    results = {}
+    pending = []
+    for context in contexts:
+        cached = cache_get(sentiment_cache, context.ticker, "sentiment")
+        if cached is not None:
+            results[context.ticker] = cached
+        else:
+            pending.append(context)
+    if not pending:
+        return results
+
+    all_headlines = await asyncio.gather(*(_fetch_news(c) for c in pending))
+    headlines_by_ticker = {c.ticker: h for c, h in zip(pending, all_headlines)}
+    sections = "\n\n".join(
+        f"{ticker}:\n" + "\n".join(f"- {h}" for h in headlines)
+        for ticker, headlines in headlines_by_ticker.items()
+    )
 
-    prompt = f"""You are a financial sentiment analyst. Analyze these news headlines for {ticker} and respond ONLY with valid JSON — no markdown, no backticks, no explanation outside the JSON.
+    try:
+        response = await model.generate_content_async(
+            _BATCH_PROMPT_TEMPLATE.format(sections=sections),
+            generation_config=_BATCH_CONFIG,
+        )
+        parsed = {
+            str(item.get("ticker", "")).upper(): item
+            for item in orjson.loads(response.text)
+            if isinstance(item, dict)
+        }
+    except Exception as e:
+        print(f"[sentiment] Gemini batch error: {e}")
+        parsed = {}
 
-Headlines:
-{headlines_text}
+    scored = [t for t in headlines_by_ticker if t in parsed]
+    finished = await asyncio.gather(
+        *(_finish(t, headlines_by_ticker[t], parsed[t]) for t in scored),
+        return_exceptions=True,
+    )
+    for ticker, result in zip(scored, finished):
+        if not isinstance(result, Exception):
+            results[ticker] = result
 
-Return this exact JSON format:
-{{"score": <float between -1.0 and 1.0>, "explanation": "<one sentence explaining the market sentiment for {ticker}>"}}
+    missing = [c for c in pending if c.ticker not in results]
+    if missing:
+        print(f"[sentiment] Batch missed {len(missing)} tickers — scoring individually")
+        for context, result in zip(missing, await asyncio.gather(*(analyze_sentiment(c) for c in missing))):
+            results[context.ticker] = result
 
-Score guide: -1.0 = extremely bearish, 0.0 = neutral, 1.0 = extremely bullish.
-Be precise and base your analysis only on the headlines provided."""
+    return results
 
-    try:
-        response = model.generate_content(prompt)
-        text = response.text.strip()
 
-        # Clean potential markdown wrapping
-        if text.startswith("```"):
-            text = text.split("\n", 1)[-1]
-            if text.endswith("```"):
-                text = text[:-3]
-            text = text.strip()
+async def analyze_sentiment(context: YFContext) -> Dict:
+    """
+    Cached sentiment for a ticker. Concurrent misses for the same ticker
+    share one Gemini call.
+    """
+    ticker = context.ticker
+    cached = cache_get(sentiment_cache, ticker, "sentiment")
+    if cached is not None:
+        return cached
 
-        result = json.loads(text)
-        score = max(-1.0, min(1.0, float(result.get("score", 0))))
-        explanation = result.get("explanation", f"Sentiment for {ticker} is neutral.")
+    return await singleflight(f"sentiment:{ticker}", lambda: _analyze_sentiment(context))
 
-        # Store in ChromaDB
-        _store_in_chromadb(ticker, headlines, score)
 
-        return {
-            "ticker": ticker,
-            "score": round(score, 4),
-            "explanation": explanation,
-            "headlineCount": len(headlines),
-        }
+async def _analyze_sentiment(context: YFContext) -> Dict:
+    """
+    1. Fetch news headlines for ticker
+    2. Send to Gemini for sentiment scoring
+    3. Store in ChromaDB
+    4. Return score + explanation
+    """
+    ticker = context.ticker
+    headlines = await _fetch_news(context)
+    headlines_text = "\n".join(f"- {h}" for h in headlines)
+
+    prompt = _PROMPT_TEMPLATE.format(ticker=ticker, headlines=headlines_text)
+
+    try:
+        response = await model.generate_content_async(prompt)
+        return await _finish(ticker, headlines, orjson.loads(response.text))
 
     except Exception as e:
         print(f"[sentiment] Gemini error for {ticker}: {e}")
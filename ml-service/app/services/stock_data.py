@@ -3,10 +3,28 @@ Stock data service — pulls price history and computes technical features using
 No API key required.
 """
 
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
 import pandas as pd
 import numpy as np
-from typing import Optional, Dict, List
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Any, Callable, Optional, Dict, FrozenSet, List, Tuple
+
+from app.services.cache import features_cache, cache_get, cache_set
+from utils._njit import njit
+
+# Shared pool for blocking yfinance / Chroma / model calls, sized for the
+# ~15 tickers a /predict request fans out to (asyncio's default pool is
+# min(32, cpu + 4), so small containers would serialize the fetches)
+_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="yf")
+
+
+def run_blocking(fn: Callable, *args) -> asyncio.Future:
+    """Run a blocking call on the shared executor without stalling the event loop."""
+    return asyncio.get_running_loop().run_in_executor(_EXECUTOR, fn, *args)
 
 # Default tickers by sector
 SECTOR_TICKERS = {
@@ -19,119 +37,281 @@ SECTOR_TICKERS = {
 
 DEFAULT_TICKERS = ["AAPL", "MSFT", "GOOGL", "NVDA", "AMZN", "META", "TSLA", "JPM", "V", "UNH"]
 
+# Company info barely changes — keep it around instead of re-scraping per request
+_INFO_TTL = 6 * 3600
+_info_cache: Dict[str, Tuple[float, Dict]] = {}
 
-def get_top_tickers(preferred_sectors: List[str]) -> List[str]:
-    """Return tickers based on preferred sectors, or defaults."""
+
+@lru_cache(maxsize=64)
+def get_top_tickers(preferred_sectors: FrozenSet[str]) -> Tuple[str, ...]:
+    """
+    Return tickers based on preferred sectors, or defaults.
+    Sector keys must already be lowercased/stripped; the result is cached.
+    """
     if not preferred_sectors:
-        return DEFAULT_TICKERS
+        return tuple(DEFAULT_TICKERS)
 
     tickers = []
-    for sector in preferred_sectors:
-        sector_key = sector.lower().strip()
+    for sector_key in preferred_sectors:
         if sector_key in SECTOR_TICKERS:
             tickers.extend(SECTOR_TICKERS[sector_key])
 
     if not tickers:
-        return DEFAULT_TICKERS
+        return tuple(DEFAULT_TICKERS)
+
+    return tuple(list(set(tickers))[:12])
 
-    return list(set(tickers))[:12]
 
+@njit(cache=True)
+def _ema(x, span):
+    """Exponential moving average (adjust=False), seeded with the first value."""
+    alpha = 2.0 / (span + 1.0)
+    out = np.empty_like(x)
+    out[0] = x[0]
+    for i in range(1, len(x)):
+        out[i] = alpha * x[i] + (1.0 - alpha) * out[i - 1]
+    return out
 
-def get_stock_features(ticker: str) -> Optional[Dict]:
+
+def batch_download(tickers: List[str], period: str = "6mo") -> Dict[str, pd.DataFrame]:
     """
-    Fetch 6 months of daily data and compute features for ML.
-    Returns a dict of features or None if data unavailable.
+    Download daily history for many tickers in one yfinance request.
+    Returns {ticker: DataFrame}; tickers with no data are left out.
     """
+    if not tickers:
+        return {}
+
     try:
-        stock = yf.Ticker(ticker)
-        df = stock.history(period="6mo", interval="1d")
+        data = yf.download(
+            tickers=" ".join(tickers),
+            period=period,
+            interval="1d",
+            group_by="ticker",
+            auto_adjust=True,
+            threads=True,
+            progress=False,
+        )
+    except Exception as e:
+        print(f"[stock_data] Batch download error: {e}")
+        return {}
+
+    if data is None or data.empty:
+        return {}
+
+    # A single ticker comes back without the ticker column level
+    if not isinstance(data.columns, pd.MultiIndex):
+        return {tickers[0]: data.dropna(how="all")}
+
+    frames = {}
+    for ticker in tickers:
+        if ticker not in data.columns.get_level_values(0):
+            continue
+        df = data[ticker].dropna(how="all")
+        if not df.empty:
+            frames[ticker] = df
+    return frames
+
+
+def get_ticker_info(ticker: str, stock: Optional[yf.Ticker] = None) -> Dict:
+    """Company info (name, sector, market cap), cached for a few hours."""
+    cached = _info_cache.get(ticker)
+    if cached and time.monotonic() - cached[0] < _INFO_TTL:
+        return cached[1]
+
+    info = (stock or yf.Ticker(ticker)).info or {}
+    _info_cache[ticker] = (time.monotonic(), info)
+    return info
+
+
+@dataclass
+class YFContext:
+    """
+    Per-request yfinance handle for one ticker. The 2y history, info and news
+    are each fetched at most once, on first use, and every consumer (features,
+    sentiment, model training) awaits the same future.
+    """
+    ticker: str
+    history_2y: Optional[pd.DataFrame] = None
+    _futures: Dict[str, asyncio.Future] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self._stock = yf.Ticker(self.ticker)
+
+    def _fetch(self, name: str, fn: Callable[[], Any]) -> asyncio.Future:
+        future = self._futures.get(name)
+        if future is None:
+            future = run_blocking(fn)
+            self._futures[name] = future
+        return future
+
+    async def history(self) -> pd.DataFrame:
+        if self.history_2y is None:
+            self.history_2y = await self._fetch(
+                "history", lambda: self._stock.history(period="2y", interval="1d")
+            )
+        return self.history_2y
+
+    async def info(self) -> Dict:
+        return await self._fetch("info", lambda: get_ticker_info(self.ticker, self._stock))
+
+    async def news(self) -> List[Dict]:
+        return await self._fetch("news", lambda: self._stock.news or [])
+
+
+@dataclass(slots=True)
+class StockFeatures:
+    """Latest price snapshot and technical indicators for one ticker."""
+    ticker: str
+    current_price: float
+    open: float
+    high: float
+    low: float
+    volume: int
+    company_name: str
+    sector: str
+    market_cap: float
+
+    # Technical features for XGBoost
+    sma5: float
+    sma20: float
+    sma50: float
+    rsi: float
+    macd: float
+    macd_signal: float
+    bb_upper: float
+    bb_lower: float
+    volatility: float
+    volume_ratio: float
 
-        if df.empty or len(df) < 30:
+    # Price momentum
+    pct_change_1d: float
+    pct_change_5d: float
+    pct_change_20d: float
+
+    # Relative position
+    price_vs_sma20: float
+    price_vs_sma50: float
+    bb_position: float
+
+    def to_dict(self) -> Dict:
+        """JSON shape used by the API (camelCase keys)."""
+        return {key: getattr(self, name) for name, key in _JSON_KEYS.items()}
+
+
+def _camel(name: str) -> str:
+    head, *rest = name.split("_")
+    return head + "".join(part.capitalize() for part in rest)
+
+
+_JSON_KEYS = {f.name: _camel(f.name) for f in fields(StockFeatures)}
+
+
+async def get_stock_features(context: YFContext) -> Optional[StockFeatures]:
+    """
+    Compute ML features from the last 6 months of the context's history.
+    Returns StockFeatures or None if data unavailable.
+    """
+    ticker = context.ticker
+    cached = cache_get(features_cache, ticker, "features")
+    if cached is not None:
+        return cached
+
+    try:
+        history = await context.history()
+        if history.empty:
             return None
 
-        df = df.sort_index()
-
-        # Current price info
-        latest = df.iloc[-1]
-        prev = df.iloc[-2] if len(df) > 1 else latest
-
-        # Technical indicators
-        close = df["Close"]
-
-        # Moving averages
-        sma_5 = close.rolling(5).mean().iloc[-1]
-        sma_20 = close.rolling(20).mean().iloc[-1]
-        sma_50 = close.rolling(50).mean().iloc[-1] if len(close) >= 50 else sma_20
-
-        # RSI (14-day)
-        delta = close.diff()
-        gain = delta.where(delta > 0, 0).rolling(14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        rs = gain / loss.replace(0, np.nan)
-        rsi = (100 - (100 / (1 + rs))).iloc[-1]
-
-        # MACD
-        ema_12 = close.ewm(span=12, adjust=False).mean()
-        ema_26 = close.ewm(span=26, adjust=False).mean()
-        macd = (ema_12 - ema_26).iloc[-1]
-        signal = (ema_12 - ema_26).ewm(span=9, adjust=False).mean().iloc[-1]
-
-        # Bollinger Bands
-        bb_mid = close.rolling(20).mean().iloc[-1]
-        bb_std = close.rolling(20).std().iloc[-1]
-        bb_upper = bb_mid + 2 * bb_std
-        bb_lower = bb_mid - 2 * bb_std
-
-        # Volatility (20-day)
-        returns = close.pct_change().dropna()
-        volatility = returns.rolling(20).std().iloc[-1] * np.sqrt(252)  # annualized
-
-        # Volume trend
-        vol_avg = df["Volume"].rolling(20).mean().iloc[-1]
-        vol_ratio = df["Volume"].iloc[-1] / vol_avg if vol_avg > 0 else 1.0
-
-        # Price changes
-        pct_1d = (latest["Close"] - prev["Close"]) / prev["Close"] if prev["Close"] > 0 else 0
-        pct_5d = (close.iloc[-1] - close.iloc[-5]) / close.iloc[-5] if len(close) >= 5 else 0
-        pct_20d = (close.iloc[-1] - close.iloc[-20]) / close.iloc[-20] if len(close) >= 20 else 0
-
-        # Get basic info
-        info = stock.info or {}
-
-        return {
-            "ticker": ticker,
-            "currentPrice": round(float(latest["Close"]), 2),
-            "open": round(float(latest["Open"]), 2),
-            "high": round(float(latest["High"]), 2),
-            "low": round(float(latest["Low"]), 2),
-            "volume": int(latest["Volume"]),
-            "companyName": info.get("shortName", ticker),
-            "sector": info.get("sector", "Unknown"),
-            "marketCap": info.get("marketCap", 0),
-
-            # Technical features for XGBoost
-            "sma5": round(float(sma_5), 4),
-            "sma20": round(float(sma_20), 4),
-            "sma50": round(float(sma_50), 4),
-            "rsi": round(float(rsi), 2) if not np.isnan(rsi) else 50.0,
-            "macd": round(float(macd), 4),
-            "macdSignal": round(float(signal), 4),
-            "bbUpper": round(float(bb_upper), 4),
-            "bbLower": round(float(bb_lower), 4),
-            "volatility": round(float(volatility), 4) if not np.isnan(volatility) else 0.2,
-            "volumeRatio": round(float(vol_ratio), 4),
-
-            # Price momentum
-            "pctChange1d": round(float(pct_1d), 6),
-            "pctChange5d": round(float(pct_5d), 6),
-            "pctChange20d": round(float(pct_20d), 6),
-
-            # Relative position
-            "priceVsSma20": round(float(latest["Close"] / sma_20 - 1), 6) if sma_20 > 0 else 0,
-            "priceVsSma50": round(float(latest["Close"] / sma_50 - 1), 6) if sma_50 > 0 else 0,
-            "bbPosition": round(float((latest["Close"] - bb_lower) / (bb_upper - bb_lower)), 4) if (bb_upper - bb_lower) > 0 else 0.5,
-        }
+        # The 6-month window is a view on the 2y frame — no extra request
+        history = history.sort_index()
+        recent = history[history.index >= history.index[-1] - pd.DateOffset(months=6)]
+
+        features = compute_features_from_df(recent, ticker, await context.info())
+        if features is not None:
+            cache_set(features_cache, ticker, features)
+        return features
 
     except Exception as e:
         print(f"[stock_data] Error fetching {ticker}: {e}")
         return None
+
+
+def compute_features_from_df(df: pd.DataFrame, ticker: str, info: Dict) -> Optional[StockFeatures]:
+    """Compute technical features from a daily OHLCV frame."""
+    if df.empty or len(df) < 30:
+        return None
+
+    df = df.sort_index()
+
+    # Current price info
+    latest = df.iloc[-1]
+
+    # Technical indicators — only the latest value of each is needed,
+    # so work on the raw arrays instead of building full rolling Series
+    close = df["Close"].to_numpy(dtype=np.float64)
+    volume = df["Volume"].to_numpy(dtype=np.float64)
+
+    # Moving averages
+    sma_5 = close[-5:].mean()
+    sma_20 = close[-20:].mean()
+    sma_50 = close[-50:].mean() if len(close) >= 50 else sma_20
+
+    # RSI (14-day)
+    delta = np.diff(close[-15:])
+    gain = delta[delta > 0].sum() / 14
+    loss = -delta[delta < 0].sum() / 14
+    rsi = 100 - (100 / (1 + gain / loss)) if loss > 0 else np.nan
+
+    # MACD
+    macd_line = _ema(close, 12) - _ema(close, 26)
+    macd = macd_line[-1]
+    signal = _ema(macd_line, 9)[-1]
+
+    # Bollinger Bands
+    bb_mid = sma_20
+    bb_std = close[-20:].std(ddof=1)
+    bb_upper = bb_mid + 2 * bb_std
+    bb_lower = bb_mid - 2 * bb_std
+
+    # Volatility (20-day)
+    returns = close[-21:][1:] / close[-21:][:-1] - 1
+    volatility = returns.std(ddof=1) * np.sqrt(252)  # annualized
+
+    # Volume trend
+    vol_avg = volume[-20:].mean()
+    vol_ratio = volume[-1] / vol_avg if vol_avg > 0 else 1.0
+
+    # Price changes
+    pct_1d = (close[-1] - close[-2]) / close[-2] if close[-2] > 0 else 0
+    pct_5d = (close[-1] - close[-5]) / close[-5]
+    pct_20d = (close[-1] - close[-20]) / close[-20]
+
+    return StockFeatures(
+        ticker=ticker,
+        current_price=float(latest["Close"]),
+        open=float(latest["Open"]),
+        high=float(latest["High"]),
+        low=float(latest["Low"]),
+        volume=int(latest["Volume"]),
+        company_name=info.get("shortName", ticker),
+        sector=info.get("sector", "Unknown"),
+        market_cap=info.get("marketCap", 0),
+
+        sma5=float(sma_5),
+        sma20=float(sma_20),
+        sma50=float(sma_50),
+        rsi=float(rsi) if not np.isnan(rsi) else 50.0,
+        macd=float(macd),
+        macd_signal=float(signal),
+        bb_upper=float(bb_upper),
+        bb_lower=float(bb_lower),
+        volatility=float(volatility) if not np.isnan(volatility) else 0.2,
+        volume_ratio=float(vol_ratio),
+
+        pct_change_1d=float(pct_1d),
+        pct_change_5d=float(pct_5d),
+        pct_change_20d=float(pct_20d),
+
+        price_vs_sma20=float(latest["Close"] / sma_20 - 1) if sma_20 > 0 else 0.0,
+        price_vs_sma50=float(latest["Close"] / sma_50 - 1) if sma_50 > 0 else 0.0,
+        bb_position=float((latest["Close"] - bb_lower) / (bb_upper - bb_lower)) if (bb_upper - bb_lower) > 0 else 0.5,
+    )
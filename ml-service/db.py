@@ -1,9 +1,16 @@
 """PostgreSQL database layer — works with Neon DB (free) or local Docker."""
 
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
-import json
+import psycopg2.pool
+import io
+import orjson
 import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 
 try:
     from dotenv import load_dotenv
@@ -11,13 +18,22 @@ try:
 except ImportError:
     pass
 
-def get_conn():
+# Decode JSONB columns (predictions.signals) with orjson
+psycopg2.extras.register_default_jsonb(globally=True, loads=orjson.loads)
+
+# NUMERIC/DECIMAL columns come back as float rather than Decimal
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'DEC2FLOAT',
+    lambda value, cur: float(value) if value is not None else None)
+psycopg2.extensions.register_type(DEC2FLOAT)
+
+def _conn_kwargs():
     url = os.environ.get('DATABASE_URL')
     if url:
         # Parse Neon URL into components — avoids sslmode/channel_binding issues
         from urllib.parse import urlparse, parse_qs
         parsed = urlparse(url)
-        return psycopg2.connect(
+        return dict(
             host=parsed.hostname,
             port=parsed.port or 5432,
             dbname=parsed.path.lstrip('/'),
@@ -26,7 +42,7 @@ def get_conn():
             sslmode='require',
         )
     # Local Docker fallback
-    return psycopg2.connect(
+    return dict(
         host=os.environ.get('DB_HOST', 'localhost'),
         port=int(os.environ.get('DB_PORT', 5432)),
         dbname=os.environ.get('DB_NAME', 'stockai'),
@@ -34,6 +50,142 @@ def get_conn():
         password=os.environ.get('DB_PASSWORD', 'stockai2025'),
     )
 
+def get_conn():
+    """Fresh, unpooled connection — for scripts and health checks."""
+    return psycopg2.connect(**_conn_kwargs())
+
+# Shared pool so queries don't pay a TCP + TLS handshake each time.
+# Created on first use, so importing db.py never connects.
+_pool = None
+_pool_lock = threading.Lock()
+# Connections currently checked out, so shutdown can wait for them to come back
+_in_use = 0
+_returned = threading.Condition(_pool_lock)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Keepalives stop idle pooled sockets being silently dropped by NAT/proxies
+                _pool = psycopg2.pool.ThreadedConnectionPool(
+                    2, 10, keepalives=1, keepalives_idle=30, **_conn_kwargs())
+    return _pool
+
+def close_pool(timeout=10):
+    """Close every pooled connection (server shutdown) once in-flight queries have
+    handed theirs back, waiting at most `timeout` seconds; the next query builds a fresh pool."""
+    global _pool
+    with _pool_lock:
+        _returned.wait_for(lambda: _in_use == 0, timeout)
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+
+# Connections idle longer than this are pinged before reuse
+_IDLE_CHECK_SECS = 30
+_last_used = {}
+
+def _alive(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < _IDLE_CHECK_SECS:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT 1')
+        cur.close()
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+def _getconn(pool, retries, delay):
+    for attempt in range(retries):
+        try:
+            conn = pool.getconn()
+        except psycopg2.pool.PoolError:
+            # All connections checked out — wait for one to come back
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay * (attempt + 1))
+            continue
+        if _alive(conn):
+            return conn
+        # Server side went away while it sat idle (Neon suspends idle computes)
+        _last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+    return pool.getconn()
+
+def _checkout(delta):
+    global _in_use
+    with _pool_lock:
+        _in_use += delta
+        if _in_use == 0:
+            _returned.notify_all()
+
+@contextmanager
+def _pooled_conn(retries=5, delay=0.2):
+    pool = _get_pool()
+    _checkout(1)
+    try:
+        conn = _getconn(pool, retries, delay)
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            # Rolls back anything left uncommitted; dead connections are discarded
+            broken = broken or bool(conn.closed)
+            if broken:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+            with _pool_lock:
+                if pool.closed:
+                    # close_pool gave up waiting — don't hand a connection back to a dead pool
+                    conn.close()
+                else:
+                    pool.putconn(conn, close=broken)
+    finally:
+        _checkout(-1)
+
+# Hot per-symbol queries, prepared once per pooled connection so the
+# server skips parse/plan on every call
+_STATEMENTS = {
+    'price_hist': '''SELECT symbol, date, open_price, high_price, low_price, close_price, volume FROM (
+                       SELECT symbol, date, open_price, high_price, low_price, close_price, volume
+                       FROM daily_prices WHERE symbol = $1 ORDER BY date DESC LIMIT $2
+                   ) t ORDER BY date ASC''',
+    'all_symbols': 'SELECT DISTINCT symbol FROM daily_prices ORDER BY symbol',
+}
+_prepared = weakref.WeakKeyDictionary()  # conn -> prepared names (False if unsupported)
+
+def _execute_prepared(conn, cur, name, params=()):
+    """EXECUTE a prepared statement, preparing it on this connection first if needed."""
+    names = _prepared.setdefault(conn, set())
+    if names is not False:
+        try:
+            if name not in names:
+                cur.execute(f'PREPARE {name} AS {_STATEMENTS[name]}')
+                names.add(name)
+            placeholders = ', '.join(['%s'] * len(params))
+            cur.execute(f'EXECUTE {name}({placeholders})' if params else f'EXECUTE {name}', params)
+            return
+        except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.DuplicatePreparedStatement):
+            # Transaction-mode poolers (e.g. Neon's -pooler endpoint) don't keep
+            # session state between transactions — stop preparing on this connection
+            conn.rollback()
+            _prepared[conn] = False
+    # Unprepared fallback: $n placeholders -> psycopg2 %s
+    sql = _STATEMENTS[name]
+    for i in range(len(params), 0, -1):
+        sql = sql.replace(f'${i}', '%s')
+    cur.execute(sql, params)
+
 def wait_for_db(retries=15, delay=2):
     import time
     for i in range(retries):
@@ -51,141 +203,226 @@ def wait_for_db(retries=15, delay=2):
                 return False
 
 def init_tables():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS daily_prices (
-            id SERIAL PRIMARY KEY,
-            symbol VARCHAR(10) NOT NULL,
-            date DATE NOT NULL,
-            open_price DECIMAL(12,4),
-            high_price DECIMAL(12,4),
-            low_price DECIMAL(12,4),
-            close_price DECIMAL(12,4),
-            volume BIGINT,
-            created_at TIMESTAMP DEFAULT NOW(),
-            UNIQUE(symbol, date)
-        )
-    ''')
-    cur.execute('CREATE INDEX IF NOT EXISTS idx_dp_sym ON daily_prices(symbol)')
-    cur.execute('CREATE INDEX IF NOT EXISTS idx_dp_date ON daily_prices(date DESC)')
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS predictions (
-            id SERIAL PRIMARY KEY,
-            symbol VARCHAR(10) NOT NULL,
-            date DATE NOT NULL,
-            prediction VARCHAR(20) NOT NULL,
-            probability DECIMAL(6,4),
-            confidence DECIMAL(6,4),
-            signals JSONB,
-            created_at TIMESTAMP DEFAULT NOW(),
-            UNIQUE(symbol, date)
-        )
-    ''')
-    cur.execute('CREATE INDEX IF NOT EXISTS idx_pred_sym ON predictions(symbol)')
-    conn.commit()
-    cur.close()
-    conn.close()
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS daily_prices (
+                id SERIAL PRIMARY KEY,
+                symbol VARCHAR(10) NOT NULL,
+                date DATE NOT NULL,
+                open_price DECIMAL(12,4),
+                high_price DECIMAL(12,4),
+                low_price DECIMAL(12,4),
+                close_price DECIMAL(12,4),
+                volume BIGINT,
+                created_at TIMESTAMP DEFAULT NOW(),
+                UNIQUE(symbol, date)
+            )
+        ''')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_dp_sym ON daily_prices(symbol)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_dp_date ON daily_prices(date DESC)')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS predictions (
+                id SERIAL PRIMARY KEY,
+                symbol VARCHAR(10) NOT NULL,
+                date DATE NOT NULL,
+                prediction VARCHAR(20) NOT NULL,
+                probability DECIMAL(6,4),
+                confidence DECIMAL(6,4),
+                signals JSONB,
+                created_at TIMESTAMP DEFAULT NOW(),
+                UNIQUE(symbol, date)
+            )
+        ''')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_pred_sym ON predictions(symbol)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_pred_date_conf ON predictions(date DESC, confidence DESC)')
+        conn.commit()
+        cur.close()
     print('[db] Tables ready')
 
-def insert_daily_prices(rows):
-    conn = get_conn()
+def insert_daily_prices_batch(conn, rows):
+    """Insert on a caller-owned connection without committing, so several
+    batches can share one transaction (and one WAL flush)."""
+    values = [(r['symbol'], r['date'], r['open'], r['high'], r['low'], r['close'], r['volume'])
+              for r in rows]
+    if not values:
+        return 0
+    # Multi-row INSERT ... VALUES pages; RETURNING counts rows actually
+    # inserted (conflicts are skipped) across pages
     cur = conn.cursor()
-    inserted = 0
-    for r in rows:
-        try:
-            cur.execute(
-                '''INSERT INTO daily_prices (symbol, date, open_price, high_price, low_price, close_price, volume)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)
-                   ON CONFLICT (symbol, date) DO NOTHING''',
-                (r['symbol'], r['date'], r['open'], r['high'], r['low'], r['close'], r['volume'])
-            )
-            inserted += 1
-        except: pass
-    conn.commit()
+    inserted = psycopg2.extras.execute_values(
+        cur,
+        '''INSERT INTO daily_prices (symbol, date, open_price, high_price, low_price, close_price, volume)
+           VALUES %s
+           ON CONFLICT (symbol, date) DO NOTHING
+           RETURNING 1''',
+        values, page_size=1000, fetch=True
+    )
     cur.close()
-    conn.close()
+    return len(inserted)
+
+def insert_daily_prices(rows):
+    if not rows:
+        return 0
+    # One commit for the whole batch — a bad row fails the batch
+    with _pooled_conn() as conn:
+        inserted = insert_daily_prices_batch(conn, rows)
+        conn.commit()
+    return inserted
+
+def _copy_prices(buf):
+    """COPY CSV `buf` into a temp staging table, then merge into daily_prices."""
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        # Dropped at commit, so the pooled connection comes back clean
+        cur.execute('''
+            CREATE TEMP TABLE tmp_prices (
+                symbol VARCHAR(10), date DATE,
+                open_price DECIMAL(12,4), high_price DECIMAL(12,4),
+                low_price DECIMAL(12,4), close_price DECIMAL(12,4),
+                volume BIGINT
+            ) ON COMMIT DROP
+        ''')
+        cur.copy_expert('COPY tmp_prices FROM STDIN WITH (FORMAT csv)', buf)
+        cur.execute(
+            '''INSERT INTO daily_prices (symbol, date, open_price, high_price, low_price, close_price, volume)
+               SELECT symbol, date, open_price, high_price, low_price, close_price, volume FROM tmp_prices
+               ON CONFLICT (symbol, date) DO NOTHING'''
+        )
+        inserted = cur.rowcount
+        conn.commit()
+        cur.close()
     return inserted
 
+def bulk_copy_price_frame(df):
+    """Bulk load a frame with symbol/date/open/high/low/close/volume columns,
+    written straight to CSV for COPY (no per-row Python objects)."""
+    if df.empty:
+        return 0
+    buf = io.StringIO()
+    df.to_csv(buf, columns=['symbol', 'date', 'open', 'high', 'low', 'close', 'volume'],
+              index=False, header=False)
+    buf.seek(0)
+    return _copy_prices(buf)
+
 def get_price_history(symbol, days=252):
-    conn = get_conn()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute('SELECT * FROM daily_prices WHERE symbol = %s ORDER BY date DESC LIMIT %s', (symbol, days))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return [{'symbol': r['symbol'], 'date': str(r['date']),
-             'open': float(r['open_price'] or 0), 'high': float(r['high_price'] or 0),
-             'low': float(r['low_price'] or 0), 'close': float(r['close_price'] or 0),
-             'volume': int(r['volume'] or 0)} for r in reversed(rows)]
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        # Newest `days` rows, handed back oldest-first by the server
+        _execute_prepared(conn, cur, 'price_hist', (symbol, days))
+        rows = cur.fetchall()
+        cur.close()
+    return [{'symbol': sym, 'date': str(date), 'open': o or 0.0, 'high': h or 0.0,
+             'low': l or 0.0, 'close': c or 0.0, 'volume': v or 0}
+            for sym, date, o, h, l, c, v in rows]
+
+def get_price_history_batch(symbols, days=252):
+    """Newest `days` rows per symbol in one query -> {symbol: rows oldest-first} (same row shape)."""
+    histories = {sym: [] for sym in symbols}
+    if not histories:
+        return histories
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            '''SELECT symbol, date, open_price, high_price, low_price, close_price, volume FROM (
+                   SELECT symbol, date, open_price, high_price, low_price, close_price, volume,
+                          ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY date DESC) AS rn
+                   FROM daily_prices WHERE symbol = ANY(%s)
+               ) t WHERE rn <= %s ORDER BY symbol, date''',
+            (list(histories), days))
+        rows = cur.fetchall()
+        cur.close()
+    for sym, date, o, h, l, c, v in rows:
+        histories[sym].append({'symbol': sym, 'date': str(date), 'open': o or 0.0, 'high': h or 0.0,
+                               'low': l or 0.0, 'close': c or 0.0, 'volume': v or 0})
+    return histories
 
 def get_all_symbols():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute('SELECT DISTINCT symbol FROM daily_prices ORDER BY symbol')
-    symbols = [r[0] for r in cur.fetchall()]
-    cur.close()
-    conn.close()
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        _execute_prepared(conn, cur, 'all_symbols')
+        symbols = [r[0] for r in cur.fetchall()]
+        cur.close()
     return symbols
 
 def get_latest_date():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute('SELECT MAX(date) FROM daily_prices')
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT MAX(date) FROM daily_prices')
+        row = cur.fetchone()
+        cur.close()
     return str(row[0]) if row and row[0] else None
 
 def get_row_count():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute('SELECT COUNT(*) FROM daily_prices')
-    count = cur.fetchone()[0]
-    cur.close()
-    conn.close()
+    """Approximate row count from planner stats (O(1)) — for logs and health checks."""
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'daily_prices'::regclass")
+        count = cur.fetchone()[0]
+        cur.close()
+    # -1 until the table has been vacuumed/analyzed at least once
+    return count if count >= 0 else get_row_count_exact()
+
+def get_row_count_exact():
+    """Exact COUNT(*) — scans the table; use where a decision depends on it."""
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*) FROM daily_prices')
+        count = cur.fetchone()[0]
+        cur.close()
     return count
 
+def save_predictions(records):
+    """Upsert many (symbol, date, prediction, probability, confidence, signals) rows in one transaction."""
+    # ON CONFLICT DO UPDATE can't touch the same row twice in one statement — last one wins
+    latest = {}
+    for symbol, date, prediction, probability, confidence, signals in records:
+        signals_json = (orjson.dumps(signals, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+                        if isinstance(signals, (list, dict)) else signals)
+        latest[(symbol, str(date))] = (symbol, date, prediction, probability, confidence, signals_json)
+    if not latest:
+        return 0
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        psycopg2.extras.execute_values(
+            cur,
+            '''INSERT INTO predictions (symbol, date, prediction, probability, confidence, signals)
+               VALUES %s
+               ON CONFLICT (symbol, date) DO UPDATE
+               SET prediction = EXCLUDED.prediction, probability = EXCLUDED.probability,
+                   confidence = EXCLUDED.confidence, signals = EXCLUDED.signals''',
+            list(latest.values()), page_size=500
+        )
+        conn.commit()
+        cur.close()
+    return len(latest)
+
 def save_prediction(symbol, date, prediction, probability, confidence, signals):
-    conn = get_conn()
-    cur = conn.cursor()
-    signals_json = json.dumps(signals) if isinstance(signals, (list, dict)) else signals
-    cur.execute(
-        '''INSERT INTO predictions (symbol, date, prediction, probability, confidence, signals)
-           VALUES (%s, %s, %s, %s, %s, %s)
-           ON CONFLICT (symbol, date) DO UPDATE
-           SET prediction = EXCLUDED.prediction, probability = EXCLUDED.probability,
-               confidence = EXCLUDED.confidence, signals = EXCLUDED.signals''',
-        (symbol, date, prediction, probability, confidence, signals_json)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    save_predictions([(symbol, date, prediction, probability, confidence, signals)])
 
 def get_predictions(symbols=None):
-    conn = get_conn()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if symbols:
-        cur.execute(
-            '''SELECT * FROM predictions WHERE symbol = ANY(%s)
-               AND date = (SELECT MAX(date) FROM predictions)
-               ORDER BY confidence DESC''', (symbols,))
-    else:
-        cur.execute(
-            '''SELECT * FROM predictions
-               WHERE date = (SELECT MAX(date) FROM predictions)
-               ORDER BY confidence DESC''')
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    result = []
-    for r in rows:
-        item = dict(r)
-        item['date'] = str(item['date'])
-        item['probability'] = float(item['probability'] or 0)
-        item['confidence'] = float(item['confidence'] or 0)
-        if isinstance(item['signals'], str):
-            try: item['signals'] = json.loads(item['signals'])
-            except: item['signals'] = []
-        result.append(item)
-    return result
+    # Latest prediction date resolved once in a CTE; latest close is joined in
+    # per symbol — one round trip, no per-row lookups
+    sql = '''WITH latest AS (SELECT MAX(date) AS d FROM predictions)
+             SELECT p.id, p.symbol, p.date, p.prediction, p.probability, p.confidence,
+                    p.signals, p.created_at, lp.close_price
+             FROM predictions p
+             JOIN latest ON p.date = latest.d
+             LEFT JOIN LATERAL (
+                 SELECT close_price FROM daily_prices d
+                 WHERE d.symbol = p.symbol ORDER BY d.date DESC LIMIT 1
+             ) lp ON TRUE
+             {where}
+             ORDER BY p.confidence DESC'''
+    with _pooled_conn() as conn:
+        cur = conn.cursor()
+        if symbols:
+            cur.execute(sql.format(where='WHERE p.symbol = ANY(%s)'), (symbols,))
+        else:
+            cur.execute(sql.format(where=''))
+        rows = cur.fetchall()
+        cur.close()
+    # signals is JSONB, so psycopg2 hands it back already parsed
+    return [{'id': r[0], 'symbol': r[1], 'date': str(r[2]), 'prediction': r[3],
+             'probability': r[4] or 0.0, 'confidence': r[5] or 0.0,
+             'signals': r[6], 'created_at': r[7], 'price': r[8]} for r in rows]
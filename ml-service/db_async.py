@@ -0,0 +1,31 @@
+"""Async read path (asyncpg) — price reads for the API server without a thread hop."""
+
+import asyncpg
+
+from db import _conn_kwargs
+
+def _pool_kwargs():
+    kw = _conn_kwargs()
+    return dict(
+        host=kw['host'],
+        port=kw['port'],
+        database=kw['dbname'],
+        user=kw['user'],
+        password=kw['password'],
+        ssl='require' if kw.get('sslmode') == 'require' else None,
+    )
+
+async def create_pool(min_size=2, max_size=10):
+    return await asyncpg.create_pool(min_size=min_size, max_size=max_size, **_pool_kwargs())
+
+async def get_price_history(pool, symbol, days=252):
+    rows = await pool.fetch(
+        '''SELECT symbol, date, open_price, high_price, low_price, close_price, volume FROM (
+               SELECT symbol, date, open_price, high_price, low_price, close_price, volume
+               FROM daily_prices WHERE symbol = $1 ORDER BY date DESC LIMIT $2
+           ) t ORDER BY date ASC''',
+        symbol, days)
+    return [{'symbol': r[0], 'date': str(r[1]),
+             'open': float(r[2] or 0), 'high': float(r[3] or 0),
+             'low': float(r[4] or 0), 'close': float(r[5] or 0),
+             'volume': int(r[6] or 0)} for r in rows]
@@ -5,10 +5,13 @@ Stock fetcher with two modes:
 """
 
 import os
+import threading
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from db import insert_daily_prices, get_row_count
+from requests.adapters import HTTPAdapter
+from db import insert_daily_prices, bulk_copy_price_frame, get_row_count
 
 try:
     from dotenv import load_dotenv
@@ -28,41 +31,91 @@ TRACKED = [
     'SPY', 'QQQ',
 ]
 
+# Keep-alive connections shared by the fetch workers
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=8))
+
+
+class RateLimiter:
+    """Thread-safe token bucket: bursts up to `capacity`, refills `rate` tokens/sec."""
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Finnhub: 60 calls/min
+_finnhub_limiter = RateLimiter(60, 1.0)
+
+
+def _price_frame(sym, df):
+    """Daily OHLCV frame -> daily_prices-shaped frame; rows without a close are skipped."""
+    df = df[df['Close'] > 0]
+    out = df[['Open', 'High', 'Low', 'Close']].round(4)
+    out.columns = ['open', 'high', 'low', 'close']
+    out.insert(0, 'date', df.index.strftime('%Y-%m-%d'))
+    out.insert(0, 'symbol', sym)
+    out['volume'] = df['Volume'].fillna(0).astype('int64')
+    return out
+
+
+def _fetch_single(yf, sym):
+    df = yf.download(sym, period='1y', interval='1d', auto_adjust=True, progress=False)
+    return _price_frame(sym, df) if df is not None and not df.empty else None
+
 
 def backfill():
     """One-time backfill using yfinance. Run locally on your Mac."""
+    import pandas as pd
     import yfinance as yf
 
     print(f'[backfill] Downloading 1 year for {len(TRACKED)} stocks via yfinance...')
-    total = 0
+    frames = []
     failed = []
 
+    # One batched download for every symbol; per-symbol requests only for gaps
+    try:
+        data = yf.download(TRACKED, period='1y', interval='1d', auto_adjust=True,
+                           group_by='ticker', threads=True, progress=False)
+    except Exception as e:
+        print(f'[backfill] Batch download failed ({e}) — falling back to per-symbol')
+        data = None
+    batched = data is not None and not data.empty and isinstance(data.columns, pd.MultiIndex)
+    available = set(data.columns.get_level_values(0)) if batched else set()
+
     for i, sym in enumerate(TRACKED):
         print(f'  ({i+1}/{len(TRACKED)}) {sym}...', end=' ', flush=True)
         try:
-            df = yf.download(sym, period='1y', interval='1d', auto_adjust=True, progress=False)
-            if df is not None and not df.empty:
-                rows = []
-                for idx, row in df.iterrows():
-                    rows.append({
-                        'symbol': sym,
-                        'date': idx.strftime('%Y-%m-%d'),
-                        'open': round(float(row.get('Open', 0)), 4),
-                        'high': round(float(row.get('High', 0)), 4),
-                        'low': round(float(row.get('Low', 0)), 4),
-                        'close': round(float(row.get('Close', 0)), 4),
-                        'volume': int(row.get('Volume', 0)),
-                    })
-                inserted = insert_daily_prices(rows)
-                total += inserted
-                print(f'{len(rows)} days')
+            prices = _price_frame(sym, data[sym].dropna(how='all')) if sym in available else None
+            if prices is None or prices.empty:
+                prices = _fetch_single(yf, sym)
+            if prices is not None and not prices.empty:
+                frames.append(prices)
+                print(f'{len(prices)} days')
             else:
                 failed.append(sym)
                 print('NO DATA')
         except Exception as e:
             failed.append(sym)
             print(f'ERROR: {e}')
-        time.sleep(0.5)
+
+    # One COPY for every symbol, streamed from the frames as CSV
+    total = bulk_copy_price_frame(pd.concat(frames)) if frames else 0
 
     print(f'[backfill] Done. {total} rows. DB total: {get_row_count()}')
     if failed:
@@ -70,43 +123,52 @@ def backfill():
     return total
 
 
+def _fetch_quote(sym, today):
+    _finnhub_limiter.acquire()
+    r = SESSION.get(
+        'https://finnhub.io/api/v1/quote',
+        params={'symbol': sym, 'token': FINNHUB_KEY},
+        timeout=10
+    )
+    q = r.json()
+    if not q or q.get('c', 0) <= 0:
+        return None
+    return {
+        'symbol': sym,
+        'date': today,
+        'open': round(q['o'], 4),
+        'high': round(q['h'], 4),
+        'low': round(q['l'], 4),
+        'close': round(q['c'], 4),
+        'volume': 0,  # quote endpoint doesn't return volume
+    }
+
+
 def fetch_latest():
     """Daily update using Finnhub quotes. Works on GitHub Actions."""
     print(f'[daily] Fetching latest quotes for {len(TRACKED)} stocks via Finnhub...')
     today = datetime.now().strftime('%Y-%m-%d')
-    total = 0
+    rows = []
     failed = []
 
-    for i, sym in enumerate(TRACKED):
-        print(f'  ({i+1}/{len(TRACKED)}) {sym}...', end=' ', flush=True)
-        try:
-            r = requests.get(
-                f'https://finnhub.io/api/v1/quote?symbol={sym}&token={FINNHUB_KEY}',
-                timeout=10
-            )
-            q = r.json()
-            if q and q.get('c', 0) > 0:
-                rows = [{
-                    'symbol': sym,
-                    'date': today,
-                    'open': round(q['o'], 4),
-                    'high': round(q['h'], 4),
-                    'low': round(q['l'], 4),
-                    'close': round(q['c'], 4),
-                    'volume': 0,  # quote endpoint doesn't return volume
-                }]
-                inserted = insert_daily_prices(rows)
-                total += inserted
-                print(f'${q["c"]:.2f}')
+    # Requests overlap under the rate limit; results are reported in TRACKED order
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        futures = [pool.submit(_fetch_quote, sym, today) for sym in TRACKED]
+        for i, (sym, future) in enumerate(zip(TRACKED, futures)):
+            try:
+                row = future.result()
+            except Exception as e:
+                failed.append(sym)
+                print(f'  ({i+1}/{len(TRACKED)}) {sym}... ERROR: {e}')
+                continue
+            if row:
+                rows.append(row)
+                print(f'  ({i+1}/{len(TRACKED)}) {sym}... ${row["close"]:.2f}')
             else:
                 failed.append(sym)
-                print('NO QUOTE')
-        except Exception as e:
-            failed.append(sym)
-            print(f'ERROR: {e}')
+                print(f'  ({i+1}/{len(TRACKED)}) {sym}... NO QUOTE')
 
-        # Finnhub: 60 calls/min
-        time.sleep(1.1)
+    total = insert_daily_prices(rows)
 
     print(f'[daily] Done. {total} rows. DB total: {get_row_count()}')
     if failed:
@@ -5,7 +5,8 @@ For each stock:
 1. Pull 1 year of daily OHLCV from PostgreSQL
 2. Engineer 18 technical features (RSI, MACD, Bollinger, momentum, etc.)
 3. Label: does stock go UP in next 5 trading days?
-4. Train XGBoost classifier with time-series split
+4. Train one XGBoost classifier across all stocks (symbol as a categorical feature),
+   with a per-stock time-series split
 5. Predict latest data point → probability, confidence, recommendation
 6. Generate signal explanations from feature values
 7. Store prediction back in PostgreSQL
@@ -14,94 +15,196 @@ For each stock:
 import numpy as np
 import pandas as pd
 import xgboost as xgb
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
 from sklearn.metrics import accuracy_score
 import json
+import os
+import joblib
+from heapq import nlargest
 from datetime import datetime
-from db import get_price_history, save_prediction, get_all_symbols
+from db import get_price_history_batch, save_predictions, get_all_symbols
+from utils._njit import njit
 
-_model_cache = {}
+# Fitted pooled model, reused until a new trading day (or backfill) changes the histories
+_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+_CACHE_PATH = os.path.join(_CACHE_DIR, 'pooled.pkl')
 
-FEATURES = [
+# Warm start: a model at most this many business days old gets a few extra rounds on
+# the new window instead of a full refit; a full refit still happens about monthly
+_WARM_MAX_GAP = 5
+_WARM_ROUNDS = 20
+_FULL_REFIT_DAYS = 21
+
+FEATURES = (
     'rsi', 'macd', 'macd_signal', 'macd_hist',
     'bb_pct', 'volatility', 'vol_ratio',
     'mom_1d', 'mom_5d', 'mom_10d', 'mom_20d',
     'price_vs_sma20', 'price_vs_sma50',
     'sma5_slope', 'sma20_slope',
     'atr_pct', 'close_to_high', 'close_to_low',
-]
+)
+
+# Display names for the "Key drivers" signal
+_FEATURE_NAMES = {'rsi': 'RSI', 'macd_hist': 'MACD', 'mom_5d': '5-day momentum', 'bb_pct': 'Bollinger position',
+                  'volatility': 'Volatility', 'vol_ratio': 'Volume', 'price_vs_sma20': 'Trend vs 20MA',
+                  'mom_20d': '20-day momentum', 'price_vs_sma50': 'Trend vs 50MA', 'atr_pct': 'ATR',
+                  'macd': 'MACD', 'macd_signal': 'MACD Signal', 'mom_1d': '1-day return',
+                  'mom_10d': '10-day momentum', 'sma5_slope': 'Short-term trend', 'sma20_slope': 'Medium-term trend',
+                  'close_to_high': 'Close vs High', 'close_to_low': 'Close vs Low'}
+
+
+@njit(cache=True)
+def _rsi_wilder(close, period=14):
+    """RSI with Wilder's smoothing, one pass. NaN until `period` deltas are available."""
+    n = len(close)
+    out = np.full(n, np.nan)
+    if n <= period:
+        return out
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, period + 1):
+        d = close[i] - close[i - 1]
+        if d > 0:
+            avg_gain += d
+        else:
+            avg_loss -= d
+    avg_gain /= period
+    avg_loss /= period
+    for i in range(period, n):
+        if i > period:
+            d = close[i] - close[i - 1]
+            avg_gain = (avg_gain * (period - 1) + max(d, 0.0)) / period
+            avg_loss = (avg_loss * (period - 1) + max(-d, 0.0)) / period
+        if avg_loss == 0.0:
+            out[i] = 100.0 if avg_gain > 0.0 else 50.0
+        else:
+            out[i] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return out
+
+
+def _ema(x, span):
+    """pandas ewm(span).mean() (adjust=True) as first-order IIR filters in C.
+
+    Numerator and normaliser are the same recurrence, run over x and over ones.
+    """
+    den = [1.0, 2.0 / (span + 1.0) - 1.0]
+    return lfilter([1.0], den, x) / lfilter([1.0], den, np.ones(len(x)))
+
+
+def _rolling_stats(x, window=20, std=True):
+    """Rolling mean (and sample std) from one strided window view, NaN-padded to len(x)."""
+    mean = np.full(len(x), np.nan)
+    sd = np.full(len(x), np.nan)
+    if len(x) >= window:
+        w = sliding_window_view(x, window)
+        mean[window - 1:] = w.mean(axis=1)
+        if std:
+            sd[window - 1:] = w.std(axis=1, ddof=1)
+    return mean, sd
+
+
+def _pct_change(x, n):
+    """Series.pct_change(n) on a plain array (NaN for the first n rows)."""
+    out = np.full(len(x), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[n:] = x[n:] / x[:-n] - 1
+    return out
 
 
 def _engineer_features(df):
-    """Compute 18 technical indicators from OHLCV."""
-    c = df['close']
-    h = df['high']
-    l = df['low']
-    v = df['volume'].astype(float)
+    """Compute 18 technical indicators from OHLCV.
+
+    Every column is built as a numpy array in `feats`, then attached with one assign
+    instead of ~25 single-column inserts into the frame.
+    """
+    c = df['close'].to_numpy(dtype=float)
+    h = df['high'].to_numpy(dtype=float)
+    l = df['low'].to_numpy(dtype=float)
+    v = df['volume'].to_numpy(dtype=float)
+    feats = {}
 
     # Moving averages
-    df['sma5'] = c.rolling(5).mean()
-    df['sma10'] = c.rolling(10).mean()
-    df['sma20'] = c.rolling(20).mean()
-    df['sma50'] = c.rolling(50).mean()
+    sma5 = _rolling_stats(c, 5, std=False)[0]
+    sma20, std20 = _rolling_stats(c)
+    sma50 = _rolling_stats(c, 50, std=False)[0]
+    feats['sma5'] = sma5
+    feats['sma10'] = _rolling_stats(c, 10, std=False)[0]
+    feats['sma20'] = sma20
+    feats['sma50'] = sma50
 
     # MA slopes (rate of change of MA)
-    df['sma5_slope'] = df['sma5'].pct_change(3)
-    df['sma20_slope'] = df['sma20'].pct_change(5)
+    feats['sma5_slope'] = _pct_change(sma5, 3)
+    feats['sma20_slope'] = _pct_change(sma20, 5)
 
-    # RSI (14-period)
-    delta = c.diff()
-    gain = delta.where(delta > 0, 0).rolling(14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-    rs = gain / loss.replace(0, np.nan)
-    df['rsi'] = 100 - (100 / (1 + rs))
+    # RSI (14-period, Wilder's smoothing)
+    feats['rsi'] = _rsi_wilder(c, 14)
 
     # MACD
-    ema12 = c.ewm(span=12).mean()
-    ema26 = c.ewm(span=26).mean()
-    df['macd'] = ema12 - ema26
-    df['macd_signal'] = df['macd'].ewm(span=9).mean()
-    df['macd_hist'] = df['macd'] - df['macd_signal']
+    macd = _ema(c, 12) - _ema(c, 26)
+    macd_signal = _ema(macd, 9)
+    feats['macd'] = macd
+    feats['macd_signal'] = macd_signal
+    feats['macd_hist'] = macd - macd_signal
 
     # Bollinger Bands
-    bb_mid = c.rolling(20).mean()
-    bb_std = c.rolling(20).std()
-    df['bb_upper'] = bb_mid + 2 * bb_std
-    df['bb_lower'] = bb_mid - 2 * bb_std
-    bb_range = df['bb_upper'] - df['bb_lower']
-    df['bb_pct'] = (c - df['bb_lower']) / bb_range.replace(0, np.nan)
+    bb_upper = sma20 + 2 * std20
+    bb_lower = sma20 - 2 * std20
+    bb_range = bb_upper - bb_lower
+    feats['bb_upper'] = bb_upper
+    feats['bb_lower'] = bb_lower
+    feats['bb_pct'] = (c - bb_lower) / np.where(bb_range == 0, np.nan, bb_range)
 
     # Volatility (annualized 20-day)
-    df['volatility'] = c.pct_change().rolling(20).std() * np.sqrt(252)
+    feats['volatility'] = _rolling_stats(_pct_change(c, 1))[1] * np.sqrt(252)
 
     # Volume ratio vs 20-day avg
-    vol_avg = v.rolling(20).mean()
-    df['vol_ratio'] = v / vol_avg.replace(0, np.nan)
+    vol_avg = _rolling_stats(v, std=False)[0]
+    feats['vol_ratio'] = v / np.where(vol_avg == 0, np.nan, vol_avg)
 
     # Momentum (returns over N days)
-    df['mom_1d'] = c.pct_change(1)
-    df['mom_5d'] = c.pct_change(5)
-    df['mom_10d'] = c.pct_change(10)
-    df['mom_20d'] = c.pct_change(20)
+    feats['mom_1d'] = _pct_change(c, 1)
+    feats['mom_5d'] = _pct_change(c, 5)
+    feats['mom_10d'] = _pct_change(c, 10)
+    feats['mom_20d'] = _pct_change(c, 20)
 
     # Price vs MAs
-    df['price_vs_sma20'] = c / df['sma20'] - 1
-    df['price_vs_sma50'] = c / df['sma50'] - 1
+    feats['price_vs_sma20'] = c / sma20 - 1
+    feats['price_vs_sma50'] = c / sma50 - 1
 
-    # ATR as % of price
-    tr = pd.concat([h - l, abs(h - c.shift(1)), abs(l - c.shift(1))], axis=1).max(axis=1)
-    df['atr_pct'] = tr.rolling(14).mean() / c
+    # ATR as % of price (fmax skips the NaN prev close on row 0, like DataFrame.max)
+    prev_c = np.r_[np.nan, c[:-1]]
+    hl = h - l
+    tr = np.fmax.reduce([hl, np.abs(h - prev_c), np.abs(l - prev_c)])
+    feats['atr_pct'] = _rolling_stats(tr, 14, std=False)[0] / c
 
     # Close relative to day range
-    day_range = h - l
-    df['close_to_high'] = (h - c) / day_range.replace(0, np.nan)
-    df['close_to_low'] = (c - l) / day_range.replace(0, np.nan)
+    day_range = np.where(hl == 0, np.nan, hl)
+    feats['close_to_high'] = (h - c) / day_range
+    feats['close_to_low'] = (c - l) / day_range
+
+    return df.assign(**feats)
+
+
+_XGB_PARAMS = {
+    'objective': 'binary:logistic',
+    'max_depth': 4,
+    'eta': 0.05,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'alpha': 0.1,
+    'lambda': 1.0,
+    'seed': 42,
+    'tree_method': 'hist',
+}
 
-    return df
+# Model input = the 18 features + the stock's index, split on as a category (not an ordinal)
+_MODEL_FEATURES = [*FEATURES, 'symbol_id']
+_FEATURE_TYPES = ['q'] * len(FEATURES) + ['c']
 
 
-def _train_and_predict(symbol):
-    """Train XGBoost on PostgreSQL data for one stock, return prediction."""
-    history = get_price_history(symbol, days=300)
+def _prepare(symbol, history):
+    """Feature frame + train/validation arrays for one stock. Returns (df, X, y, split) or None."""
     if len(history) < 80:
         print(f'  [ml] {symbol}: skipped (only {len(history)} rows)')
         return None
@@ -116,46 +219,120 @@ def _train_and_predict(symbol):
     df['future_ret'] = df['close'].shift(-5) / df['close'] - 1
     df['target'] = (df['future_ret'] > 0).astype(int)
 
-    df = df.dropna(subset=FEATURES + ['target'])
+    df = df.dropna(subset=[*FEATURES, 'target'])
     if len(df) < 60:
         return None
 
-    X = df[FEATURES].values
-    y = df['target'].values
+    # XGBoost works in float32 anyway — hand it a contiguous float32 buffer, no internal copy
+    X = np.ascontiguousarray(df[list(FEATURES)].to_numpy(), dtype=np.float32)
+    y = df['target'].to_numpy().astype(np.int32, copy=False)
 
     # Time-based train/test (80/20)
     split = int(len(X) * 0.8)
-    X_train, X_test = X[:split], X[split:]
-    y_train, y_test = y[:split], y[split:]
-
-    model = xgb.XGBClassifier(
-        n_estimators=200,
-        max_depth=4,
-        learning_rate=0.05,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        reg_alpha=0.1,
-        reg_lambda=1.0,
-        eval_metric='logloss',
-        random_state=42,
-    )
-    model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
-    _model_cache[symbol] = model
-
-    # Predict on latest row
-    latest_X = X[-1:]
-    proba = model.predict_proba(latest_X)[0]
-    up_prob = float(proba[1]) if len(proba) > 1 else 0.5
-
-    # Confidence = validation accuracy
-    val_preds = model.predict(X_test)
-    val_acc = accuracy_score(y_test, val_preds)
-
-    # Feature importances for explainability
-    importances = dict(zip(FEATURES, model.feature_importances_))
-
-    # Latest feature values for signal generation
-    latest_row = df.iloc[-1]
+    return df, X, y, split
+
+
+def _dmatrix(data, label=None):
+    return xgb.DMatrix(data, label=label, feature_names=_MODEL_FEATURES,
+                       feature_types=_FEATURE_TYPES, enable_categorical=True)
+
+
+def _train(dtrain, prev=None):
+    """Fit the pooled booster (native API, no sklearn wrapper).
+
+    With `prev`, keep boosting that model for a few rounds instead of starting over.
+    """
+    if prev is not None:
+        return xgb.train(_XGB_PARAMS, dtrain, num_boost_round=_WARM_ROUNDS, xgb_model=prev)
+    return xgb.train(_XGB_PARAMS, dtrain, num_boost_round=200)
+
+
+def _load_cached():
+    """Last stored pooled-model entry (dict) or None."""
+    try:
+        entry = joblib.load(_CACHE_PATH)
+    except Exception:
+        return None
+    if not isinstance(entry, dict) or not isinstance(entry.get('model'), xgb.Booster):
+        return None
+    return entry
+
+
+def _store_cached(entry):
+    os.makedirs(_CACHE_DIR, exist_ok=True)
+    tmp = f'{_CACHE_PATH}.{os.getpid()}.tmp'
+    joblib.dump(entry, tmp)
+    os.replace(tmp, _CACHE_PATH)
+
+
+def _can_warm_start(entry, symbols, latest_date):
+    """Same symbol coding, previous model recent enough to extend, last full refit not too old."""
+    return (entry['symbols'] == symbols
+            and np.busday_count(entry['latest_date'], latest_date) <= _WARM_MAX_GAP
+            and np.busday_count(entry['full_fit'], latest_date) < _FULL_REFIT_DAYS)
+
+
+def _train_and_predict_all(prepared, use_cache=True):
+    """Fit one model over every stock's training rows; return {symbol: prediction}.
+
+    `prepared` maps symbol -> _prepare() output. Each stock keeps its own 80/20 split,
+    so confidence is still that stock's validation accuracy. With use_cache=False the
+    pooled cache is neither read nor written (subset runs, per-symbol fallback).
+    """
+    if not prepared:
+        return {}
+    symbols = tuple(prepared)
+    # Append the symbol index as the last column (stays contiguous float32)
+    data = {sym: np.column_stack([X, np.full(len(X), i, dtype=np.float32)])
+            for i, (sym, (_, X, _, _)) in enumerate(prepared.items())}
+    key = tuple((sym, df['date'].iloc[-1], len(df)) for sym, (df, _, _, _) in prepared.items())
+    latest_date = max(k[1] for k in key)
+
+    entry = _load_cached() if use_cache else None
+    if entry and entry['key'] == key:
+        # Same data as the last run — skip training, only score each stock's latest row
+        model, val_acc, importances = entry['model'], entry['val_acc'], entry['importances']
+        latest = model.predict(_dmatrix(np.vstack([data[sym][-1:] for sym in symbols])))
+        up_prob = dict(zip(symbols, latest.tolist()))
+    else:
+        dtrain = _dmatrix(np.vstack([data[sym][:split] for sym, (_, _, _, split) in prepared.items()]),
+                          label=np.concatenate([y[:split] for _, _, y, split in prepared.values()]))
+        if entry and _can_warm_start(entry, symbols, latest_date):
+            model = _train(dtrain, prev=entry['model'])
+            full_fit = entry['full_fit']
+        else:
+            model = _train(dtrain)
+            full_fit = latest_date
+
+        # One pass over the trees for every validation slice (each ends with its latest row)
+        up_probs = model.predict(_dmatrix(np.vstack([data[sym][split:] for sym, (_, _, _, split) in prepared.items()])))
+        up_prob, val_acc = {}, {}
+        start = 0
+        for sym, (_, X, y, split) in prepared.items():
+            probs = up_probs[start:start + len(X) - split]
+            start += len(X) - split
+            up_prob[sym] = float(probs[-1])
+            # Confidence = validation accuracy (same 0.5 cut as XGBClassifier.predict)
+            val_acc[sym] = accuracy_score(y[split:], (probs > 0.5).astype(int))
+
+        # Feature importances for explainability (features never split on score 0)
+        gain = model.get_score(importance_type='gain')
+        importances = {f: gain.get(f, 0.0) for f in FEATURES}
+        if use_cache:
+            try:
+                _store_cached({'key': key, 'symbols': symbols, 'latest_date': latest_date, 'model': model,
+                               'val_acc': val_acc, 'importances': importances, 'full_fit': full_fit})
+            except OSError as e:
+                print(f'  [ml] model cache write failed ({e})')
+
+    return {sym: _result(sym, prepared[sym][0], up_prob[sym], val_acc[sym], importances) for sym in symbols}
+
+
+def _result(symbol, df, up_prob, val_acc, importances):
+    """Prediction record for one stock from its feature frame and model outputs."""
+    # Latest feature values for signal generation, as plain floats (None for NaN)
+    cols = [*FEATURES, 'close']
+    latest_row = {k: (None if np.isnan(x) else float(x)) for k, x in zip(cols, df[cols].to_numpy()[-1])}
     signals = _build_signals(latest_row, up_prob, val_acc, importances)
 
     # Map probability → recommendation
@@ -176,17 +353,17 @@ def _train_and_predict(symbol):
         'probability': round(up_prob, 4),
         'confidence': round(val_acc, 4),
         'signals': signals,
-        'price': round(float(latest_row['close']), 2),
-        'rsi': round(float(latest_row['rsi']), 1) if not np.isnan(latest_row['rsi']) else None,
-        'macd': round(float(latest_row['macd']), 4) if not np.isnan(latest_row['macd']) else None,
-        'volatility': round(float(latest_row['volatility']), 4) if not np.isnan(latest_row['volatility']) else None,
-        'momentum_5d': round(float(latest_row['mom_5d']) * 100, 2) if not np.isnan(latest_row['mom_5d']) else None,
-        'momentum_20d': round(float(latest_row['mom_20d']) * 100, 2) if not np.isnan(latest_row['mom_20d']) else None,
+        'price': round(latest_row['close'], 2),
+        'rsi': round(latest_row['rsi'], 1) if latest_row['rsi'] is not None else None,
+        'macd': round(latest_row['macd'], 4) if latest_row['macd'] is not None else None,
+        'volatility': round(latest_row['volatility'], 4) if latest_row['volatility'] is not None else None,
+        'momentum_5d': round(latest_row['mom_5d'] * 100, 2) if latest_row['mom_5d'] is not None else None,
+        'momentum_20d': round(latest_row['mom_20d'] * 100, 2) if latest_row['mom_20d'] is not None else None,
     }
 
 
 def _build_signals(row, up_prob, val_acc, importances):
-    """Generate human-readable explanations from ML features."""
+    """Generate human-readable explanations from ML features (`row`: feature -> float or None)."""
     signals = []
 
     # ML prediction headline
@@ -206,8 +383,8 @@ def _build_signals(row, up_prob, val_acc, importances):
         signals.append({'text': f'Low model confidence: {val_acc*100:.0f}% — take with caution', 'type': 'bearish'})
 
     # RSI
-    rsi = row.get('rsi', 50)
-    if not np.isnan(rsi):
+    rsi = row.get('rsi')
+    if rsi is not None:
         if rsi > 75:
             signals.append({'text': f'RSI at {rsi:.0f} — heavily overbought, pullback likely', 'type': 'bearish'})
         elif rsi > 65:
@@ -220,42 +397,41 @@ def _build_signals(row, up_prob, val_acc, importances):
             signals.append({'text': f'RSI at {rsi:.0f} — neutral zone', 'type': 'neutral'})
 
     # MACD
-    macd_h = row.get('macd_hist', 0)
-    if not np.isnan(macd_h):
-        if macd_h > 0 and row.get('macd', 0) > row.get('macd_signal', 0):
+    macd_h = row.get('macd_hist')
+    if macd_h is not None:  # macd / macd_signal come from the same pass, so they're set too
+        if macd_h > 0 and row['macd'] > row['macd_signal']:
             signals.append({'text': 'MACD bullish crossover — positive momentum building', 'type': 'bullish'})
-        elif macd_h < 0 and row.get('macd', 0) < row.get('macd_signal', 0):
+        elif macd_h < 0 and row['macd'] < row['macd_signal']:
             signals.append({'text': 'MACD bearish crossover — momentum fading', 'type': 'bearish'})
 
     # Bollinger position
-    bb = row.get('bb_pct', 0.5)
-    if not np.isnan(bb):
+    bb = row.get('bb_pct')
+    if bb is not None:
         if bb > 0.95:
             signals.append({'text': 'Price touching upper Bollinger Band — extended', 'type': 'bearish'})
         elif bb < 0.05:
             signals.append({'text': 'Price at lower Bollinger Band — potential bounce zone', 'type': 'bullish'})
 
     # Trend (price vs MA)
-    vs_sma20 = row.get('price_vs_sma20', 0)
-    vs_sma50 = row.get('price_vs_sma50', 0)
-    if not np.isnan(vs_sma20):
+    vs_sma20 = row.get('price_vs_sma20')
+    vs_sma50 = row.get('price_vs_sma50')
+    if vs_sma20 is not None and vs_sma50 is not None:
         if vs_sma20 > 0.05 and vs_sma50 > 0.05:
             signals.append({'text': 'Strong uptrend — above both 20 and 50-day moving averages', 'type': 'bullish'})
         elif vs_sma20 < -0.05 and vs_sma50 < -0.05:
             signals.append({'text': 'Downtrend — below both 20 and 50-day moving averages', 'type': 'bearish'})
 
     # Momentum
-    mom5 = row.get('mom_5d', 0)
-    mom20 = row.get('mom_20d', 0)
-    if not np.isnan(mom5):
+    mom5 = row.get('mom_5d')
+    if mom5 is not None:
         if mom5 > 0.05:
             signals.append({'text': f'Strong 5-day momentum: +{mom5*100:.1f}%', 'type': 'bullish'})
         elif mom5 < -0.05:
             signals.append({'text': f'Weak 5-day momentum: {mom5*100:.1f}%', 'type': 'bearish'})
 
     # Volatility
-    vol = row.get('volatility', 0)
-    if not np.isnan(vol):
+    vol = row.get('volatility')
+    if vol is not None:
         if vol > 0.6:
             signals.append({'text': f'Very high volatility ({vol*100:.0f}% annualized) — risky', 'type': 'bearish'})
         elif vol > 0.4:
@@ -264,22 +440,16 @@ def _build_signals(row, up_prob, val_acc, importances):
             signals.append({'text': f'Low volatility ({vol*100:.0f}%) — stable', 'type': 'bullish'})
 
     # Volume
-    vr = row.get('vol_ratio', 1)
-    if not np.isnan(vr):
+    vr = row.get('vol_ratio')
+    if vr is not None:
         if vr > 2.0:
             signals.append({'text': f'Unusual volume ({vr:.1f}x average) — big move possible', 'type': 'neutral'})
         elif vr > 1.5:
             signals.append({'text': f'Above-average volume ({vr:.1f}x) — confirms trend', 'type': 'neutral'})
 
     # Top feature importance
-    top_features = sorted(importances.items(), key=lambda x: x[1], reverse=True)[:3]
-    names = {'rsi': 'RSI', 'macd_hist': 'MACD', 'mom_5d': '5-day momentum', 'bb_pct': 'Bollinger position',
-             'volatility': 'Volatility', 'vol_ratio': 'Volume', 'price_vs_sma20': 'Trend vs 20MA',
-             'mom_20d': '20-day momentum', 'price_vs_sma50': 'Trend vs 50MA', 'atr_pct': 'ATR',
-             'macd': 'MACD', 'macd_signal': 'MACD Signal', 'mom_1d': '1-day return',
-             'mom_10d': '10-day momentum', 'sma5_slope': 'Short-term trend', 'sma20_slope': 'Medium-term trend',
-             'close_to_high': 'Close vs High', 'close_to_low': 'Close vs Low'}
-    top_names = [names.get(f[0], f[0]) for f in top_features]
+    top_features = nlargest(3, importances.items(), key=lambda kv: kv[1])
+    top_names = [_FEATURE_NAMES.get(f[0], f[0]) for f in top_features]
     signals.append({'text': f'Key drivers: {", ".join(top_names)}', 'type': 'neutral'})
 
     return signals
@@ -287,27 +457,53 @@ def _build_signals(row, up_prob, val_acc, importances):
 
 def run_predictions(symbols=None):
     """Run ML for given symbols or all in DB. Returns list of predictions."""
+    # Only a full-universe run may read/replace the pooled cache — a subset fit would
+    # otherwise overwrite it and the next full run would warm-start from the wrong model
+    use_cache = symbols is None
     if symbols is None:
         symbols = get_all_symbols()
 
     today = datetime.now().strftime('%Y-%m-%d')
     results = []
 
+    # All histories in one query
+    histories = get_price_history_batch(symbols, days=300)
+
     print(f'[ml] Running predictions for {len(symbols)} stocks...')
+    prepared = {}
     for sym in symbols:
         try:
-            result = _train_and_predict(sym)
-            if result:
-                save_prediction(
-                    sym, today, result['prediction'],
-                    result['probability'], result['confidence'],
-                    result['signals']
-                )
-                results.append(result)
-                print(f'  ✓ {sym}: {result["prediction"]} (prob={result["probability"]:.2f}, acc={result["confidence"]:.2f})')
+            p = _prepare(sym, histories[sym])
+            if p:
+                prepared[sym] = p
         except Exception as e:
             print(f'  ✗ {sym}: {e}')
 
+    try:
+        by_symbol = _train_and_predict_all(prepared, use_cache)
+    except Exception as e:
+        # Don't lose every symbol to one bad pooled fit — train each on its own instead
+        print(f'[ml] Pooled training failed ({e}) — training per symbol')
+        by_symbol = {}
+        for sym, p in prepared.items():
+            try:
+                by_symbol.update(_train_and_predict_all({sym: p}, use_cache=False))
+            except Exception as e:
+                print(f'  ✗ {sym}: {e}')
+    for sym, result in by_symbol.items():
+        results.append(result)
+        print(f'  ✓ {sym}: {result["prediction"]} (prob={result["probability"]:.2f}, acc={result["confidence"]:.2f})')
+
+    # One batched upsert instead of a round trip per symbol
+    try:
+        save_predictions([
+            (r['symbol'], today, r['prediction'], r['probability'], r['confidence'], r['signals'])
+            for r in results
+        ])
+    except Exception as e:
+        print(f'[ml] Saving predictions failed: {e}')
+        return []
+
     results.sort(key=lambda r: r['confidence'] * abs(r['probability'] - 0.5), reverse=True)
     print(f'[ml] Done. {len(results)} predictions.')
     return results
@@ -4,7 +4,7 @@ ML Pipeline — two modes:
 - Daily (GitHub Actions): update with Finnhub quotes + retrain
 """
 
-from db import wait_for_db, init_tables, get_row_count
+from db import wait_for_db, init_tables, get_row_count_exact
 from fetcher import backfill, fetch_latest
 from predictor import run_predictions
 
@@ -17,7 +17,7 @@ def main():
 
     init_tables()
 
-    rows = get_row_count()
+    rows = get_row_count_exact()
     if rows < 100:
         # First run — try yfinance backfill (works locally)
         try:
@@ -33,7 +33,7 @@ def main():
         print(f'[pipeline] DB has {rows} rows — fetching latest via Finnhub...')
         fetch_latest()
 
-    rows_after = get_row_count()
+    rows_after = get_row_count_exact()
     if rows_after > 100:
         print('[pipeline] Running XGBoost predictions...')
         results = run_predictions()
@@ -5,19 +5,9 @@ Run: python3 seed_sample_data.py
 """
 
 from datetime import datetime, timedelta
-import random
-from db import get_conn, get_row_count, insert_daily_prices
-
-TRACKED = [
-    'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'META', 'TSLA',
-    'JPM', 'V', 'UNH', 'MA', 'HD', 'PG', 'JNJ', 'COST', 'ABBV',
-    'CRM', 'NFLX', 'AMD', 'ORCL', 'KO', 'PEP', 'DIS', 'INTC',
-    'BA', 'GS', 'AMGN', 'CAT', 'IBM',
-    'PLTR', 'SOFI', 'RIVN', 'ROKU', 'SNAP', 'SQ', 'SHOP', 'DKNG',
-    'MARA', 'COIN', 'HOOD', 'RBLX', 'CRWD', 'NET',
-    'NIO', 'LCID', 'PLUG', 'BB', 'NOK',
-    'SPY', 'QQQ',
-]
+import numpy as np
+from db import get_row_count, get_row_count_exact, insert_daily_prices
+from fetcher import TRACKED
 
 # Approximate base prices for seed data
 BASE_PRICES = {
@@ -35,43 +25,46 @@ BASE_PRICES = {
 }
 
 
-def gen_prices(symbol, days=252):
+def trading_dates(days=252):
+    """Weekday date strings over the last `days` calendar days, oldest first."""
+    start = datetime.now().date() - timedelta(days=days)
+    dates = (start + timedelta(days=i) for i in range(days))
+    return [d.strftime('%Y-%m-%d') for d in dates if d.weekday() < 5]
+
+
+def gen_prices(symbol, days=252, dates=None, rng=None):
     """Generate ~1 year of daily OHLCV with random walk."""
-    base = BASE_PRICES.get(symbol, 100)
-    rows = []
-    d = datetime.now().date() - timedelta(days=days)
-    close = base
-    for _ in range(days):
-        if d.weekday() >= 5:  # skip weekends
-            d += timedelta(days=1)
-            continue
-        ret = random.gauss(0.0002, 0.015)
-        open_p = close
-        close = round(open_p * (1 + ret), 4)
-        high = round(max(open_p, close) * (1 + abs(random.gauss(0, 0.005))), 4)
-        low = round(min(open_p, close) * (1 - abs(random.gauss(0, 0.005))), 4)
-        vol = int(random.uniform(5e6, 50e6))
-        rows.append({
-            'symbol': symbol,
-            'date': d.strftime('%Y-%m-%d'),
-            'open': open_p,
-            'high': high,
-            'low': low,
-            'close': close,
-            'volume': vol,
-        })
-        d += timedelta(days=1)
-    return rows
+    if dates is None:
+        dates = trading_dates(days)
+    if rng is None:
+        rng = np.random.default_rng()
+    n = len(dates)
+    base = float(BASE_PRICES.get(symbol, 100))
+
+    closes = np.round(base * np.cumprod(1 + rng.normal(0.0002, 0.015, n)), 4)
+    opens = np.r_[base, closes[:-1]]
+    highs = np.round(np.maximum(opens, closes) * (1 + np.abs(rng.normal(0, 0.005, n))), 4)
+    lows = np.round(np.minimum(opens, closes) * (1 - np.abs(rng.normal(0, 0.005, n))), 4)
+    vols = rng.integers(5_000_000, 50_000_000, n)
+
+    # .tolist() hands psycopg2 plain Python floats/ints
+    return [
+        {'symbol': symbol, 'date': d, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+        for d, o, h, l, c, v in zip(dates, opens.tolist(), highs.tolist(), lows.tolist(),
+                                    closes.tolist(), vols.tolist())
+    ]
 
 
 def main():
-    if get_row_count() > 100:
+    if get_row_count_exact() > 100:
         print('[seed] DB already has data, skipping.')
         return
     print('[seed] Generating sample data for', len(TRACKED), 'stocks...')
+    dates = trading_dates()  # same calendar for every symbol — build it once
+    rng = np.random.default_rng()
     all_rows = []
     for sym in TRACKED:
-        all_rows.extend(gen_prices(sym))
+        all_rows.extend(gen_prices(sym, dates=dates, rng=rng))
     inserted = insert_daily_prices(all_rows)
     print(f'[seed] Inserted {inserted} rows. Total: {get_row_count()}')
 
@@ -7,13 +7,39 @@ StockAI API Server
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
+import time
 
-from db import wait_for_db, init_tables, get_row_count, get_latest_date, get_predictions, get_price_history
+from db import wait_for_db, init_tables, get_row_count, get_latest_date, get_predictions, get_price_history, close_pool
+import db_async
+
+# asyncpg pool for the read endpoints; None until startup connects
+_apool = None
+
+# Predictions only change once a day (pipeline run), so serve them from memory
+PRED_TTL = 60
+_preds_cache = {'ts': float('-inf'), 'preds': [], 'by_symbol': {}}
+_preds_lock = asyncio.Lock()
+
+def _store_preds(preds):
+    _preds_cache['preds'] = preds
+    _preds_cache['by_symbol'] = {p['symbol']: p for p in preds}
+    _preds_cache['ts'] = time.monotonic()
+
+async def _get_preds_cached():
+    if time.monotonic() - _preds_cache['ts'] > PRED_TTL:
+        async with _preds_lock:
+            # Another request may have refreshed while we waited on the lock
+            if time.monotonic() - _preds_cache['ts'] > PRED_TTL:
+                _store_preds(await asyncio.to_thread(get_predictions))
+    return _preds_cache
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global _apool
     if not wait_for_db():
         print('[ERROR] Cannot connect to DB')
         yield
@@ -21,35 +47,50 @@ async def lifespan(app: FastAPI):
     init_tables()
     print(f'[server] DB: {get_row_count()} rows, latest: {get_latest_date()}')
     preds = get_predictions()
+    _store_preds(preds)
     print(f'[server] {len(preds)} predictions cached')
+    try:
+        _apool = await db_async.create_pool()
+    except Exception as e:
+        print(f'[server] asyncpg pool unavailable ({e}) — using psycopg2 for reads')
     yield
+    if _apool is not None:
+        await _apool.close()
+        _apool = None
+    # Waits for queries still running in worker threads to release their connections
+    await asyncio.to_thread(close_pool)
 
-app = FastAPI(title='StockAI API', lifespan=lifespan)
+app = FastAPI(title='StockAI API', lifespan=lifespan, default_response_class=ORJSONResponse)
 app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
 
 @app.get('/health')
-def health():
-    return {'status': 'ok', 'db': 'Neon PostgreSQL', 'rows': get_row_count(), 'latest': get_latest_date()}
+async def health():
+    rows, latest = await asyncio.gather(asyncio.to_thread(get_row_count), asyncio.to_thread(get_latest_date))
+    return {'status': 'ok', 'db': 'Neon PostgreSQL', 'rows': rows, 'latest': latest}
 
 @app.get('/api/insights/my')
-def my_insights(symbols: str):
-    sym_list = [s.strip().upper() for s in symbols.split(',') if s.strip()]
-    cached = get_predictions(sym_list)
+async def my_insights(symbols: str):
+    wanted = {s.strip().upper() for s in symbols.split(',') if s.strip()}
+    cache = await _get_preds_cached()
+    cached = [p for p in cache['preds'] if p['symbol'] in wanted]  # keeps confidence order
     return {'predictions': cached, 'count': len(cached)}
 
 @app.get('/api/insights/discover')
-def discover_insights():
-    cached = get_predictions()
+async def discover_insights():
+    cached = (await _get_preds_cached())['preds']
     return {'predictions': cached, 'count': len(cached)}
 
 @app.get('/api/insights/{symbol}')
-def single_insight(symbol: str):
-    cached = get_predictions([symbol.upper()])
-    return cached[0] if cached else {'error': f'No data for {symbol}'}
+async def single_insight(symbol: str):
+    pred = (await _get_preds_cached())['by_symbol'].get(symbol.upper())
+    return pred if pred else {'error': f'No data for {symbol}'}
 
 @app.get('/api/prices/{symbol}')
-def prices(symbol: str, days: int = 60):
-    return {'symbol': symbol.upper(), 'prices': get_price_history(symbol.upper(), days)}
+async def prices(symbol: str, days: int = 60):
+    if _apool is None:
+        # psycopg2 fallback is blocking — keep it off the event loop
+        return {'symbol': symbol.upper(), 'prices': await asyncio.to_thread(get_price_history, symbol.upper(), days)}
+    return {'symbol': symbol.upper(), 'prices': await db_async.get_price_history(_apool, symbol.upper(), days)}
 
 # Dev-only: trigger ML locally
 @app.post('/api/refresh')
@@ -59,6 +100,7 @@ def refresh():
         from predictor import run_predictions
         fetch_latest()
         results = run_predictions()
+        _preds_cache['ts'] = float('-inf')  # next read reloads
         return {'refreshed': len(results)}
     except Exception as e:
         return {'error': str(e)}
@@ -0,0 +1,41 @@
+"""
+Build the training feature panel and the cross-ticker XGBoost model used by
+the ML microservice. Saves app/models/features.pkl and universal.joblib; the
+service loads both at startup and reloads them when this job rewrites them.
+Training runs here, never inside the API workers.
+Run once:     python3 train_universal.py
+Run nightly:  python3 train_universal.py --schedule
+"""
+
+import sys
+
+from dotenv import load_dotenv
+
+from app.services.predictor import train_universal_model
+
+load_dotenv()
+
+
+def schedule():
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    # Daily bars settle after the 4pm ET close; retrain once they're in
+    scheduler = BlockingScheduler(timezone="America/New_York")
+    scheduler.add_job(
+        train_universal_model,
+        "cron",
+        day_of_week="mon-fri",
+        hour=17,
+        minute=30,
+        id="nightly_features",
+        coalesce=True,
+        max_instances=1,
+    )
+    scheduler.start()
+
+
+if __name__ == "__main__":
+    if "--schedule" in sys.argv[1:]:
+        schedule()
+    else:
+        train_universal_model()
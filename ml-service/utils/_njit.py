@@ -0,0 +1,13 @@
+"""
+numba's @njit when numba is installed, otherwise a no-op decorator —
+the decorated functions still run, just as plain Python.
+"""
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        # Support both @njit and @njit(cache=True)
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn